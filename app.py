@@ -24,6 +24,13 @@ except:
     st.error("Models not found! Please run training first.")
     st.stop()
 
+# Retraining runs in a worker process; the new model is activated on the
+# shared engine when it is ready
+@st.cache_resource
+def load_training_runner():
+    from training_jobs import TrainingJobRunner
+    return TrainingJobRunner(engine)
+
 # Sidebar Navigation
 st.sidebar.image("https://cdn-icons-png.flaticon.com/512/4762/4762311.png", width=100)
 st.sidebar.title("Navigation")
@@ -43,66 +50,67 @@ lang_code = lang_options[selected_lang_name]
 # File Uploader
 st.sidebar.markdown("---")
 uploaded_file = st.sidebar.file_uploader("📂 Upload Student Data (CSV)", type=["csv"])
+# Rows without an external_id column are matched by cohort + name on re-upload
+cohort = st.sidebar.text_input("Cohort", "default")
 
-import pandas as pd
 import database as db
+import csv_ingest
 
-# Initialize DB
-db.init_db()
+# DB schema is created on first connection, once per process
 
 if uploaded_file is not None:
     try:
-        # Try reading with comma first, then semicolon
-        try:
-            df = pd.read_csv(uploaded_file)
-            if len(df.columns) < 5: # Likely wrong delimiter
-                uploaded_file.seek(0)
-                df = pd.read_csv(uploaded_file, sep=';')
-        except:
-            uploaded_file.seek(0)
-            df = pd.read_csv(uploaded_file, sep=';')
+        # Only the header is parsed here; rows are streamed in chunks on save
+        info = csv_ingest.inspect(uploaded_file, engine.feature_names)
+        if info["missing_features"]:
+            raise ValueError(f"Missing columns: {', '.join(info['missing_features'])}")
             
-        st.sidebar.success(f"Loaded {len(df)} students from file!")
+        st.sidebar.success(f"Loaded {uploaded_file.name} ({info['size'] / 1e6:.1f} MB, '{info['sep']}' separated)")
         
         # Check if we can retrain (needs G3)
-        if 'G3' in df.columns:
+        if info["has_target"]:
             if st.sidebar.button("🔄 Retrain Model"):
-                with st.spinner("Retraining..."):
-                    engine.train(df=df)
-                    st.success("Model Retrained on your data!")
+                job_id = load_training_runner().submit(csv_ingest.load_training_frame(uploaded_file, engine.feature_names))
+                st.session_state['training_job'] = job_id
+                st.sidebar.info(f"Training job #{job_id} started; predictions use the current model until it finishes.")
         
         # Process and Save to DB
         if st.sidebar.button("💾 Save to Database"):
             with st.spinner("Processing & Saving..."):
-                # Run predictions first to populate risk/score
-                results = engine.predict_batch(df)
-                
-                # Rename columns to match DB schema if needed
-                # DB expects: predicted_score, risk_level (int)
-                results['predicted_score'] = results['Predicted Score']
-                results['risk_level'] = results['Risk Val']
-                
-                # Drop UI columns not in DB
-                cols_to_keep = ["G1", "G2", "G3", "studytime", "failures", "absences", "health", "freetime", "goout", "risk_level", "predicted_score"]
-                # Add name if missing
-                if "name" not in results.columns:
-                    results["name"] = [f"Student {i}" for i in range(len(results))]
-                    cols_to_keep.append("name")
-                
-                # Filter columns
-                db_df = results[[c for c in cols_to_keep if c in results.columns]]
-                
-                db.bulk_insert(db_df)
-                st.sidebar.success("Data saved to Database!")
+                bar = st.sidebar.progress(0.0, text="Saving...")
+                # Predict chunk by chunk, then upsert in one short transaction:
+                # a bad row anywhere means nothing is saved. Re-uploads update rows in place.
+                try:
+                    saved = csv_ingest.save_upload(
+                        uploaded_file, engine, cohort=cohort or db.DEFAULT_COHORT,
+                        progress=lambda done, total: bar.progress(done / total, text=f"Processed {done / 1e6:.1f} / {total / 1e6:.1f} MB")
+                    )
+                except Exception as e:
+                    st.sidebar.error(f"Nothing was saved, the upload was rolled back: {e}")
+                else:
+                    st.sidebar.success(f"Saved {saved:,} students to Database!")
                 
     except Exception as e:
         st.sidebar.error(f"Error: {e}")
 
-# Load data from DB for global use
-student_data = db.get_all_students()
-if not student_data.empty:
-    st.session_state['student_data_db'] = student_data
-    st.sidebar.info(f"📚 Database: {len(student_data)} students")
+# Status of this session's latest training job
+if 'training_job' in st.session_state:
+    from training_jobs import get_job, SUCCEEDED, FAILED
+    job = get_job(st.session_state['training_job'])
+    if job is None:
+        del st.session_state['training_job']
+    elif job['status'] == SUCCEEDED:
+        st.sidebar.success(f"Model retrained (job #{job['job_id']}, version {job['version']})")
+    elif job['status'] == FAILED:
+        st.sidebar.error(f"Training job #{job['job_id']} failed: {job['error']}")
+    else:
+        st.sidebar.info(f"Training job #{job['job_id']}: {job['status']}...")
+        st.sidebar.button("Refresh status")
+
+# Views query the DB themselves; only the count is needed here
+total_students = db.count_students()
+if total_students:
+    st.sidebar.info(f"📚 Database: {total_students} students")
 else:
     st.sidebar.warning("Database is empty. Upload CSV or Add Student.")
 
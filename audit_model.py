@@ -1,56 +1,87 @@
+import tempfile
+import time
 import pandas as pd
-import numpy as np
 import xgboost as xgb
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, accuracy_score, r2_score
-import pickle
+import storage
+from model_engine import ModelEngine, RISK_MODE_CLASSIFIER, RISK_MODE_DERIVED
+from training_pipeline import cross_validate, prepare
+
+def _best_time(fn, repeats=5):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def compare_risk_modes(df, params, cv):
+    """Two boosters (regressor + classifier) vs. risk derived from the regressor alone."""
+    print("\nRisk Mode Comparison (same folds and hyperparameters):")
+    print(f"   {'':<28}{'classifier':>12}{'derived':>12}")
+    print(f"   {'Risk accuracy (CV)':<28}{cv['cv_accuracy'] * 100:>11.1f}%{cv['cv_accuracy_derived'] * 100:>11.1f}%")
+    fit_two = cv['fit_time_regressor_s'] + cv['fit_time_classifier_s']
+    print(f"   {'Training time (all folds)':<28}{fit_two:>11.2f}s{cv['fit_time_regressor_s']:>11.2f}s")
+
+    # Inference cost of each mode on the same rows
+    batch = pd.concat([df] * 100, ignore_index=True)
+    row = df.iloc[0][ModelEngine().feature_names].to_dict()
+    timings = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in (RISK_MODE_CLASSIFIER, RISK_MODE_DERIVED):
+            engine = ModelEngine(artifact_dir=f"{tmp}/{mode}", risk_mode=mode, cache_size=0)
+            engine.train(df=df, params=params)
+            X = batch[engine.feature_names]
+            bundle = engine.bundle
+            timings[mode] = (
+                _best_time(lambda: bundle.predict_risk(X, bundle.regressor.predict(X))),
+                _best_time(lambda: engine._predict_one(row), repeats=50),
+            )
+    (batch_two, one_two), (batch_der, one_der) = timings[RISK_MODE_CLASSIFIER], timings[RISK_MODE_DERIVED]
+    print(f"   {f'Batch predict ({len(batch)} rows)':<28}{batch_two * 1e3:>10.1f}ms{batch_der * 1e3:>10.1f}ms")
+    print(f"   {'Single prediction + SHAP':<28}{one_two * 1e3:>10.2f}ms{one_der * 1e3:>10.2f}ms")
 
 def audit_model():
     print("--- Model Reality Audit ---")
     
+    feature_names = ["G1", "G2", "studytime", "failures", "absences", "health", "freetime", "goout"]
+
     # 1. Check Data Source
     try:
-        df = pd.read_csv("student-mat.csv", sep=';')
+        df = storage.load("student-mat.csv", columns=feature_names + ["G3"])
         print(f"[OK] Data Source: Real Kaggle Dataset found ({len(df)} rows)")
     except Exception as e:
         print(f"[ERROR] Data Source Error: {e}")
         return
 
-    # 2. Train/Test Split & Evaluate
-    feature_names = ["G1", "G2", "studytime", "failures", "absences", "health", "freetime", "goout"]
-    X = df[feature_names]
-    y_score = df['G3']
-    y_risk = pd.cut(df['G3'], bins=[-1, 9, 14, 21], labels=[2, 1, 0]).astype(int)
-
-    X_train, X_test, y_train, y_test = train_test_split(X, y_score, test_size=0.2, random_state=42)
-    _, _, y_risk_train, y_risk_test = train_test_split(X, y_risk, test_size=0.2, random_state=42)
-
-    # Load trained model
-    try:
-        with open("models.pkl", "rb") as f:
-            models = pickle.load(f)
-            regressor = models["regressor"]
-            classifier = models["classifier"]
-            print("[OK] Model Artifact: 'models.pkl' loaded successfully")
-    except:
-        print("[ERROR] Model Artifact: Not found (Training new one for audit...)")
-        regressor = xgb.XGBRegressor(objective='reg:squarederror')
-        regressor.fit(X_train, y_train)
-        classifier = xgb.XGBClassifier(eval_metric='mlogloss')
-        classifier.fit(X_train, y_risk_train)
+    # 2. Load trained model
+    engine = ModelEngine()
+    if engine.load_models():
+        regressor = engine.regressor
+        print(f"[OK] Model Artifact: version '{engine.current_version() or 'models.pkl'}' loaded successfully")
+        params = (engine.metadata or {}).get("params") or {}
+        print(f"[OK] Risk Mode: {engine.bundle.risk_mode}")
+    else:
+        print("[ERROR] Model Artifact: Not found (auditing the default configuration)")
+        regressor = None
+        params = {}
 
-    # 3. Metrics
-    preds = regressor.predict(X_test)
-    rmse = np.sqrt(mean_squared_error(y_test, preds))
-    r2 = r2_score(y_test, preds)
-    
-    risk_preds = classifier.predict(X_test)
-    acc = accuracy_score(y_risk_test, risk_preds)
+    # 3. Metrics: k-fold CV of the saved configuration. Every score comes from
+    # rows the fold's model never saw (the saved model itself was fit on all
+    # rows, so scoring it on any split of them would be optimistic).
+    cv = cross_validate(df, params, folds=5)
+    rmse, r2, acc = cv["cv_rmse"], cv["cv_r2"], cv["cv_accuracy"]
+    if regressor is None:
+        X, y_score, _ = prepare(df)
+        regressor = xgb.XGBRegressor(objective='reg:squarederror', **{"n_estimators": 100, **params})
+        regressor.fit(X, y_score)
 
-    print(f"\nPerformance Metrics (Real Test Set):")
-    print(f"   - RMSE (Error Margin): {rmse:.2f} (Scale 0-20)")
+    print(f"\nPerformance Metrics (5-fold cross-validation, held-out rows only):")
+    print(f"   - RMSE (Error Margin): {rmse:.2f} ± {cv['cv_rmse_std']:.2f} (Scale 0-20)")
     print(f"   - R2 Score (Accuracy): {r2:.2f} (Target > 0.8)")
     print(f"   - Risk Classification Accuracy: {acc*100:.1f}%")
+    if engine.bundle is not None and engine.bundle.risk_mode == RISK_MODE_DERIVED:
+        acc = cv["cv_accuracy_derived"]
+        print(f"   - Risk Accuracy (derived from score, as deployed): {acc*100:.1f}%")
 
     if r2 > 0.8:
         print("[GOOD] Verdict: HIGH ACCURACY. The model is effectively using G1/G2 to predict G3.")
@@ -59,6 +90,8 @@ def audit_model():
     else:
         print("[BAD] Verdict: POOR ACCURACY. Model is guessing.")
 
+    compare_risk_modes(df, params, cv)
+
     # 4. Feature Importance
     print("\nKey Drivers (Feature Importance):")
     importances = regressor.feature_importances_
@@ -0,0 +1,105 @@
+"""
+Benchmark: synthetic data generation throughput.
+
+Times data_generator.generate (vectorized, seeded) for each cohort size and
+reports log rows per second, plus the original per-student/per-day loop on
+a small cohort for comparison (it is O(students x days) Python calls for
+the logs and O(tests x students x logs) for the scores).
+
+With --out-dir the largest size is also generated sharded across --workers
+processes into Parquet partitions (data_generator.generate_partitioned).
+
+Usage: python bench_data_generator.py [--sizes 1000 10000 100000] [--days 180]
+                                      [--loop-students 50] [--names]
+                                      [--out-dir /tmp/gen --workers 4 --shard-size 50000]
+"""
+import argparse
+import random
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+import data_generator
+
+def legacy_generate(n_students, days, seed=0):
+    """The generator before vectorization: iterrows loops over Python random."""
+    random.seed(seed)
+    np.random.seed(seed)
+    students = pd.DataFrame({
+        "student_id": [f"s{i}" for i in range(n_students)],
+        "baseline_ability": np.random.normal(0.5, 0.15, n_students),
+    })
+    end = pd.Timestamp("2024-06-30")
+    dates = [(end - timedelta(days=i)).date() for i in range(days, -1, -1)]
+    logs = []
+    for _, student in students.iterrows():
+        for d in dates:
+            logs.append({
+                "student_id": student['student_id'],
+                "date": d,
+                "study_hours": round(max(0, np.random.normal(student['baseline_ability'] * 4, 1.0)), 1),
+                "attendance": 1 if random.random() < (0.7 + student['baseline_ability'] * 0.3) else 0,
+                "focus_subject": random.choice(data_generator.SUBJECTS),
+                "sleep_hours": round(np.random.normal(7, 1), 1),
+                "screen_time": round(np.random.normal(3, 1.5), 1),
+            })
+    logs = pd.DataFrame(logs)
+    scores = []
+    for test_date in sorted(logs['date'].unique())[::7]:
+        for _, student in students.iterrows():
+            window = logs[(logs['student_id'] == student['student_id']) &
+                          (logs['date'] <= test_date) & (logs['date'] > test_date - timedelta(days=7))]
+            avg_study = window['study_hours'].mean() if not window.empty else 0
+            avg_sleep = window['sleep_hours'].mean() if not window.empty else 7
+            score = (student['baseline_ability'] * 60 + avg_study * 8
+                     - max(0, (7 - avg_sleep) * 2) + np.random.normal(0, 5))
+            scores.append({"student_id": student['student_id'], "date": test_date,
+                           "subject": random.choice(data_generator.TEST_SUBJECTS),
+                           "score": round(max(0, min(100, score)), 1)})
+    return students, logs, pd.DataFrame(scores)
+
+def time_call(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--loop-students", type=int, default=50, help="cohort size for the legacy loop (0 to skip)")
+    parser.add_argument("--names", action="store_true", help="include Faker names in the vectorized runs")
+    parser.add_argument("--out-dir", help="also time sharded generation into this directory")
+    parser.add_argument("--workers", type=int, help="processes for --out-dir (default: one per core)")
+    parser.add_argument("--shard-size", type=int, default=data_generator.SHARD_STUDENTS)
+    args = parser.parse_args()
+
+    print(f"{'students':>10} {'log rows':>12} {'score rows':>11} {'seconds':>9} {'rows/s':>12} {'MB':>8}")
+    vectorized_rate = None
+    for n in args.sizes:
+        elapsed, (students, logs, scores) = time_call(
+            data_generator.generate, n, args.days, seed=0, end_date="2024-06-30", names=args.names)
+        rate = len(logs) / elapsed
+        vectorized_rate = vectorized_rate or rate
+        mb = (logs.memory_usage(deep=True).sum() + scores.memory_usage(deep=True).sum()) / 1e6
+        print(f"{n:>10,} {len(logs):>12,} {len(scores):>11,} {elapsed:>9.2f} {rate:>12,.0f} {mb:>8.1f}")
+        del students, logs, scores
+
+    if args.out_dir:
+        n = max(args.sizes)
+        elapsed, stats = time_call(data_generator.generate_partitioned, args.out_dir, n, args.days, seed=0,
+                                   end_date="2024-06-30", names=args.names, workers=args.workers,
+                                   shard_size=args.shard_size)
+        print(f"\nSharded, {n:,} students in {stats['shards']} shards on {stats['workers']} workers: "
+              f"{stats['daily_logs']:,} log rows written in {elapsed:.2f}s ({stats['daily_logs'] / elapsed:,.0f} rows/s)")
+
+    if args.loop_students:
+        elapsed, (_, logs, _) = time_call(legacy_generate, args.loop_students, args.days)
+        rate = len(logs) / elapsed
+        print(f"\nLegacy loop, {args.loop_students} students: {len(logs):,} log rows in {elapsed:.2f}s "
+              f"({rate:,.0f} rows/s); vectorized is {vectorized_rate / rate:.0f}x faster")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Load test: database reads per minute with and without the snapshot cache.
+
+Simulates --sessions concurrent app sessions, each rerunning every
+--think seconds and doing what a rerun reads (student count, risk
+distribution, the full student table), while one writer adds a student every
+--write-every seconds. Runs against a temporary database filled
+with --rows students and reports SQL queries/min and reruns/min for each mode.
+
+Usage: python bench_db_reads.py [--sessions 300] [--rows 2000] [--seconds 20]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import database as db
+
+def fill(rows):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "name": [f"Student {i}" for i in range(rows)],
+        **{c: rng.integers(0, 21, rows) for c in ["G1", "G2", "G3"]},
+        "studytime": rng.integers(1, 5, rows), "failures": rng.integers(0, 4, rows),
+        "absences": rng.integers(0, 30, rows), "health": rng.integers(1, 6, rows),
+        "freetime": rng.integers(1, 6, rows), "goout": rng.integers(1, 6, rows),
+        "risk_level": rng.integers(0, 3, rows), "predicted_score": rng.uniform(0, 20, rows).round(1),
+    })
+    db.bulk_insert(df)
+
+def run(sessions, seconds, think, write_every):
+    """Return (queries, reruns, writes, elapsed) for a run of about `seconds`."""
+    stop = threading.Event()
+    reruns = [0] * sessions
+    writes = [0]
+
+    def session(i):
+        while not stop.is_set():
+            db.count_students()
+            db.risk_distribution()
+            db.get_all_students()
+            reruns[i] += 1
+            stop.wait(think)
+
+    def writer():
+        while not stop.wait(write_every):
+            db.add_student({"name": "Load Test", "G1": 10, "G2": 10, "G3": 10, "risk_level": 1})
+            writes[0] += 1
+
+    before = db.read_stats()["queries"]
+    start = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(i,), daemon=True) for i in range(sessions)]
+    threads.append(threading.Thread(target=writer, daemon=True))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    # Reruns already in flight still count, so time the drain too
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return db.read_stats()["queries"] - before, sum(reruns), writes[0], elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--think", type=float, default=2.0, help="seconds between reruns per session")
+    parser.add_argument("--write-every", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_NAME = os.path.join(tmp, "load_test.db")
+        fill(args.rows)
+        print(f"{args.sessions} sessions, {args.rows} rows, rerun every {args.think}s, "
+              f"write every {args.write_every}s")
+        print(f"{'mode':<16} {'SQL reads/min':>14} {'reruns/min':>11} {'writes/min':>11}")
+        for label, enabled in [("no cache", False), ("snapshot cache", True)]:
+            db.SNAPSHOT_CACHE = enabled
+            queries, reruns, writes, elapsed = run(args.sessions, args.seconds, args.think, args.write_every)
+            scale = 60 / elapsed
+            print(f"{label:<16} {queries * scale:>14.0f} {reruns * scale:>11.0f} {writes * scale:>11.1f}")
+        db.close_pool()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark: vectorized feature engine vs the original iterrows loop.
+
+The loop is O(scores x logs), so for large cohorts it is timed on a random
+sample of score rows (against the full logs table) and extrapolated.
+With --workers the vectorized engine is also timed on that many processes
+(compute_features(workers=N)) to show the parallel speedup.
+
+Usage: python bench_feature_engineering.py [--sizes 200 10000 100000] [--days 30]
+                                           [--workers 8]
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from feature_engineering import compute_features, compute_features_loop
+
+def make_dataset(n_students, days, seed=0):
+    """Synthetic students/logs/scores shaped like data_generator's output."""
+    rng = np.random.default_rng(seed)
+    ids = np.array([f"s{i:07d}" for i in range(n_students)], dtype=object)
+    students = pd.DataFrame({
+        "student_id": ids,
+        "grade_level": rng.choice([9, 10, 11, 12], n_students),
+    })
+    dates = np.array([date(2024, 1, 1) + timedelta(days=d) for d in range(days + 1)])
+    logs = pd.DataFrame({
+        "student_id": np.repeat(ids, len(dates)),
+        "date": np.tile(dates, n_students),
+        "study_hours": rng.normal(2, 1, n_students * len(dates)).clip(0).round(1),
+        "attendance": (rng.random(n_students * len(dates)) < 0.85).astype(int),
+        "sleep_hours": rng.normal(7, 1, n_students * len(dates)).round(1),
+        "screen_time": rng.normal(3, 1.5, n_students * len(dates)).round(1),
+    })
+    test_dates = dates[::7]
+    scores = pd.DataFrame({
+        "student_id": np.tile(ids, len(test_dates)),
+        "date": np.repeat(test_dates, n_students),
+        "subject": rng.choice(["Math", "Science", "English"], n_students * len(test_dates)),
+        "score": rng.uniform(0, 100, n_students * len(test_dates)).round(1),
+    })
+    return students, logs, scores
+
+def time_vectorized(students, logs, scores, workers=None):
+    start = time.perf_counter()
+    compute_features(students, logs, scores, workers=workers)
+    return time.perf_counter() - start
+
+def time_loop(students, logs, scores, sample, seed=0):
+    """Returns (seconds, extrapolated)."""
+    logs = logs.copy()
+    logs['date'] = pd.to_datetime(logs['date'])
+    subset = scores
+    if len(scores) > sample:
+        subset = scores.sample(sample, random_state=seed)
+    start = time.perf_counter()
+    compute_features_loop(students, logs, subset.copy())
+    elapsed = time.perf_counter() - start
+    return elapsed * len(scores) / len(subset), len(subset) < len(scores)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200, 10_000, 100_000])
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--loop-sample", type=int, default=500,
+                        help="max score rows timed with the loop before extrapolating")
+    parser.add_argument("--workers", type=int, help="also time the partitioned engine on this many processes")
+    args = parser.parse_args()
+
+    print(f"{'students':>10} {'logs':>10} {'scores':>8} {'loop (s)':>12} {'vectorized (s)':>15} {'speedup':>9}")
+    for n in args.sizes:
+        students, logs, scores = make_dataset(n, args.days)
+        vec = time_vectorized(students, logs, scores)
+        loop, estimated = time_loop(students, logs, scores, args.loop_sample)
+        loop_str = f"{loop:.2f}" + ("*" if estimated else "")
+        print(f"{n:>10} {len(logs):>10} {len(scores):>8} {loop_str:>12} {vec:>15.3f} {loop / vec:>8.0f}x")
+        if args.workers:
+            par = time_vectorized(students, logs, scores, args.workers)
+            print(f"{'':>10} {args.workers} workers: {par:.3f}s ({vec / par:.2f}x vs one process)")
+    print("* extrapolated from a sample of score rows")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Import-time profile of the app and CLI entry modules.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter for
+each module and reports the cumulative import time, plus the heaviest
+third-party packages it pulled in. Run a few times; the first run after
+install includes .pyc compilation.
+
+Usage: python bench_imports.py [--modules model_engine database ...] [--top 5]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+DEFAULT_MODULES = [
+    "model_engine", "database", "recommendations", "feature_engineering",
+    "views.student_view", "views.teacher_view", "views.parent_view",
+]
+
+def profile(module):
+    """Return {package: cumulative_us} for every import done by `import module`."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    timings = {}
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = int(cumulative)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--top", type=int, default=5)
+    args = parser.parse_args()
+
+    watched = ["xgboost", "shap", "sklearn", "plotly.express", "plotly.graph_objects",
+               "sqlalchemy", "pyarrow", "streamlit", "pandas"]
+    print(f"{'module':<22} {'total ms':>9}   heaviest packages (ms)")
+    for module in args.modules:
+        timings = profile(module)
+        heavy = sorted(((timings[p], p) for p in watched if p in timings), reverse=True)[:args.top]
+        detail = ", ".join(f"{p} {us / 1e3:.0f}" for us, p in heavy)
+        print(f"{module:<22} {timings.get(module, 0) / 1e3:>9.0f}   {detail}")
+
+if __name__ == "__main__":
+    main()
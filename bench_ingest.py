@@ -0,0 +1,67 @@
+"""
+Benchmark: rows/sec of the bulk insert paths into the students table.
+
+Each path loads the same --rows synthetic students into a fresh database
+(schema and indexes created as the app does):
+  to_sql             the previous bulk_insert (DataFrame.to_sql, append)
+  ingest             executemany in one transaction, indexes kept
+  ingest + rebuild   same, dropping the indexes and rebuilding them after
+
+Usage: python bench_ingest.py [--rows 200000] [--chunk-size 50000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import database as db
+
+def make_students(rows):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "name": [f"Student {i}" for i in range(rows)],
+        **{c: rng.integers(0, 21, rows) for c in ["G1", "G2", "G3"]},
+        "studytime": rng.integers(1, 5, rows), "failures": rng.integers(0, 4, rows),
+        "absences": rng.integers(0, 30, rows), "health": rng.integers(1, 6, rows),
+        "freetime": rng.integers(1, 6, rows), "goout": rng.integers(1, 6, rows),
+        "risk_level": rng.integers(0, 3, rows), "predicted_score": rng.uniform(0, 20, rows).round(1),
+    })
+
+def to_sql(df):
+    with db.connection() as conn:
+        df.to_sql('students', conn, if_exists='append', index=False)
+
+def timed(tmp, label, load, df):
+    db.close_pool()
+    db.DB_NAME = os.path.join(tmp, f"{label.replace(' ', '_')}.db")
+    db.init_db()
+    start = time.perf_counter()
+    load(df)
+    elapsed = time.perf_counter() - start
+    assert db.count_students() == len(df)
+    db.close_pool()
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--chunk-size", type=int, default=db.INGEST_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    df = make_students(args.rows)
+    cases = [
+        ("to_sql", to_sql),
+        ("ingest", lambda d: db.ingest(d, chunk_size=args.chunk_size, drop_indexes=False)),
+        ("ingest + rebuild", lambda d: db.ingest(d, chunk_size=args.chunk_size, drop_indexes=True)),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'path':<18} {'seconds':>8} {'rows/sec':>10}")
+        for label, load in cases:
+            elapsed = timed(tmp, label, load, df)
+            print(f"{label:<18} {elapsed:>8.2f} {args.rows / elapsed:>10.0f}")
+
+if __name__ == "__main__":
+    main()
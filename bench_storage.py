@@ -0,0 +1,101 @@
+"""
+Benchmark: cold load time and peak memory, CSV vs Parquet.
+
+Writes a synthetic daily_logs.csv with several million rows into a temporary
+directory, converts it with storage.convert(), then loads it in fresh
+subprocesses (so every load is cold and peak RSS is per-load). Peak memory
+is read from /proc and is therefore Linux only.
+
+Usage: python bench_storage.py [--students 20000] [--days 150]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import storage
+
+CHILD = r"""
+import json, sys, time
+import pandas as pd
+sys.path.insert(0, {repo!r})
+import storage
+
+def peak_kb():
+    # VmHWM (unlike ru_maxrss) is reset by exec, so it is this process's own peak
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+
+mode, path, columns = sys.argv[1], sys.argv[2], json.loads(sys.argv[3])
+before = peak_kb()
+start = time.perf_counter()
+if mode == "csv":
+    df = pd.read_csv(path, usecols=columns)
+else:
+    df = storage.load(path, columns=columns)
+elapsed = time.perf_counter() - start
+peak = peak_kb()
+print(json.dumps({{"seconds": elapsed, "peak_mb": (peak - before) / 1024,
+                  "frame_mb": df.memory_usage(deep=True).sum() / 1e6, "rows": len(df)}}))
+"""
+
+def write_logs_csv(path, n_students, days, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = np.array([str(uuid.UUID(int=int(x))) for x in rng.integers(0, 2**63, n_students)], dtype=object)
+    dates = np.array([(date(2024, 1, 1) + timedelta(days=d)).isoformat() for d in range(days)], dtype=object)
+    n = n_students * days
+    pd.DataFrame({
+        "student_id": np.repeat(ids, days),
+        "date": np.tile(dates, n_students),
+        "study_hours": rng.normal(2, 1, n).clip(0).round(1),
+        "attendance": (rng.random(n) < 0.85).astype(int),
+        "focus_subject": rng.choice(["Math", "Science", "English", "History"], n),
+        "sleep_hours": rng.normal(7, 1, n).round(1),
+        "screen_time": rng.normal(3, 1.5, n).round(1),
+    }).to_csv(path, index=False)
+
+def run_child(mode, path, columns):
+    code = CHILD.format(repo=os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", code, mode, path, json.dumps(columns)],
+                         check=True, capture_output=True, text=True)
+    return json.loads(out.stdout)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=20_000)
+    parser.add_argument("--days", type=int, default=150)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "daily_logs.csv")
+        write_logs_csv(csv_path, args.students, args.days)
+        start = time.perf_counter()
+        pq_path = storage.convert(csv_path)
+        convert_s = time.perf_counter() - start
+        print(f"rows: {args.students * args.days:,}  csv: {os.path.getsize(csv_path) / 1e6:.0f} MB  "
+              f"parquet: {os.path.getsize(pq_path) / 1e6:.0f} MB  (convert {convert_s:.1f}s)\n")
+
+        projected = ["student_id", "date", "study_hours", "attendance"]
+        cases = [
+            ("csv (pd.read_csv)", "csv", None),
+            ("parquet", "parquet", None),
+            ("csv, 4 columns", "csv", projected),
+            ("parquet, 4 columns", "parquet", projected),
+        ]
+        print(f"{'load':<22} {'seconds':>8} {'peak MB':>9} {'frame MB':>9}")
+        for label, mode, columns in cases:
+            r = run_child(mode, csv_path, columns)
+            print(f"{label:<22} {r['seconds']:>8.2f} {r['peak_mb']:>9.0f} {r['frame_mb']:>9.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Streaming import of uploaded student CSVs.
+
+The delimiter is sniffed from the first few kilobytes and the file is then
+parsed in chunks with only the columns the app stores (usecols), so memory
+stays flat however large the upload is. save_upload validates and predicts
+each chunk and spools the rows to a temporary Parquet file; only when the
+whole file has passed does it upsert the spooled chunks in one short write
+transaction, so a large upload does not hold the database write lock while
+it parses and predicts.
+"""
+import csv
+import hashlib
+import os
+import tempfile
+import pandas as pd
+import database as db
+from schema import apply_schema
+
+SNIFF_BYTES = 4096
+CHUNK_ROWS = 50_000
+DELIMITERS = ",;\t|"
+
+# Columns read from an upload besides the model features
+EXTRA_COLUMNS = ["name", "external_id", "G3"]
+
+def sniff(f):
+    """
+    Return (delimiter, header columns) of a CSV file object, read from its
+    first SNIFF_BYTES. The file is rewound afterwards.
+    """
+    f.seek(0)
+    sample = f.read(SNIFF_BYTES)
+    f.seek(0)
+    if isinstance(sample, bytes):
+        sample = sample.decode("utf-8", errors="ignore")
+    sample = sample.lstrip("\ufeff")
+    if "\n" in sample:
+        sample = sample[:sample.rindex("\n")]  # sniff whole lines only
+    header_line = sample.splitlines()[0] if sample else ""
+    try:
+        sep = csv.Sniffer().sniff(sample, delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        # e.g. a single line: take the candidate that splits the header most
+        sep = max(DELIMITERS, key=header_line.count)
+    header = next(csv.reader([header_line], delimiter=sep), [])
+    return sep, [col.strip() for col in header]
+
+def file_digest(f):
+    """SHA-256 hex digest of the whole file's content. The position is kept."""
+    position = f.tell()
+    f.seek(0)
+    digest = hashlib.sha256()
+    block = f.read(1 << 20)
+    while block:
+        digest.update(block.encode("utf-8") if isinstance(block, str) else block)
+        block = f.read(1 << 20)
+    f.seek(position)
+    return digest.hexdigest()
+
+def file_size(f):
+    position = f.tell()
+    f.seek(0, 2)
+    size = f.tell()
+    f.seek(position)
+    return size
+
+def read_chunks(f, columns, chunksize=CHUNK_ROWS):
+    """
+    Yield the upload in chunks of chunksize rows, parsing only the given
+    columns that the file has, with compact dtypes and range validation.
+    """
+    sep, header = sniff(f)
+    usecols = [col for col in columns if col in header]
+    for chunk in pd.read_csv(f, sep=sep, usecols=usecols, chunksize=chunksize):
+        yield apply_schema(chunk)
+
+def inspect(f, feature_names):
+    """Delimiter and which of the stored columns the upload provides, without parsing rows."""
+    sep, header = sniff(f)
+    missing = [col for col in feature_names if col not in header]
+    return {"sep": sep, "columns": header, "missing_features": missing,
+            "has_target": "G3" in header, "size": file_size(f)}
+
+def load_training_frame(f, feature_names, chunksize=CHUNK_ROWS):
+    """The model features and G3 only, read chunk by chunk."""
+    columns = feature_names + ["G3"]
+    return pd.concat((chunk[columns] for chunk in read_chunks(f, columns, chunksize)), ignore_index=True)
+
+def save_upload(f, engine, cohort=db.DEFAULT_COHORT, chunksize=CHUNK_ROWS, progress=None):
+    """
+    Predict and upsert every row of the upload. All chunks are parsed,
+    validated and predicted first (outside any transaction); the rows are
+    then written in a single transaction, so if any chunk fails (e.g. a value
+    out of range on a late row) nothing from the upload is saved, and other
+    writers only wait for the final upsert.
+    Rows are matched by external_id, else by cohort + name. Rows with
+    neither are keyed by the file's content hash and their row number (and
+    named "Student {row number}"), so re-uploading the same file maps them
+    to the same students while different files never overwrite each other.
+    An edited file without names or ids therefore adds new students.
+    progress: optional callable(bytes_read, total_bytes), called after each
+        chunk has been predicted.
+    Returns the number of rows saved.
+    """
+    info = inspect(f, engine.feature_names)
+    if info["missing_features"]:
+        raise ValueError(f"Missing columns: {', '.join(info['missing_features'])}")
+    digest = file_digest(f)[:16]
+
+    saved = 0
+    with tempfile.TemporaryDirectory() as spool:
+        paths = []
+        for chunk in read_chunks(f, engine.feature_names + EXTRA_COLUMNS, chunksize):
+            results = engine.predict_batch(chunk)
+            results['predicted_score'] = results['Predicted Score']
+            results['risk_level'] = results['Risk Val']
+            rows = pd.RangeIndex(saved, saved + len(results))
+            if "name" not in results.columns:
+                results["name"] = pd.Series(pd.NA, index=results.index, dtype="string")
+            # Nameless rows without an id: key on the file identity, not on a made-up name
+            results["student_key"] = db.natural_keys(results, cohort).fillna(
+                pd.Series([f"{cohort}:file-{digest}:{i}" for i in rows], index=results.index))
+            names = results["name"].astype("string")
+            results["name"] = names.mask(names.isna() | (names.str.strip() == ""),
+                                         pd.Series([f"Student {i}" for i in rows], index=results.index))
+            paths.append(os.path.join(spool, f"chunk-{len(paths):05d}.parquet"))
+            results[[c for c in db.DB_COLUMNS if c in results.columns]].to_parquet(paths[-1], index=False)
+            saved += len(chunk)
+            if progress:
+                progress(min(f.tell(), info["size"]), info["size"])
+
+        with db.transaction() as conn:
+            for path in paths:
+                db.upsert_students(pd.read_parquet(path), cohort=cohort, drop_indexes=False, conn=conn)
+    return saved
@@ -1,95 +1,229 @@
-import pandas as pd
+"""
+Synthetic students, daily logs and weekly test scores.
+
+Everything is generated with NumPy on (students x days) grids from one
+np.random.Generator, so a seed reproduces the same dataset and millions of
+log rows take seconds. Student and subject ids are categoricals (one code
+per row instead of one Python string). Faker is only used for the optional
+student names.
+
+With --out-dir the students are split into shards of --shard-size that a
+process pool generates independently: each shard gets its own seed spawned
+from --seed (np.random.SeedSequence), so the output does not depend on the
+number of workers, and writes its own part-NNNNN.parquet under students/,
+daily_logs/ and scores/. Memory is bounded by one shard per worker.
+storage.load / feature_engineering.load_data read those directories directly.
+
+Usage: python data_generator.py [--students 200] [--days 30] [--seed 42]
+                                [--end-date 2024-06-30] [--no-names]
+                                [--out-dir data --workers 4 --shard-size 50000]
+"""
+import argparse
+import glob
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from multiprocessing import get_context
+
 import numpy as np
-from faker import Faker
-import random
-from datetime import datetime, timedelta
-
-fake = Faker()
-
-def generate_students(n=100):
-    students = []
-    for _ in range(n):
-        student = {
-            "student_id": fake.uuid4(),
-            "name": fake.name(),
-            "grade_level": random.choice([9, 10, 11, 12]),
-            "baseline_ability": np.random.normal(0.5, 0.15) # 0 to 1 scale
-        }
-        students.append(student)
-    return pd.DataFrame(students)
-
-def generate_daily_logs(students_df, days=30):
-    logs = []
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=days)
-    
-    for _, student in students_df.iterrows():
-        current_date = start_date
-        while current_date <= end_date:
-            # Simulate study habits based on ability + noise
-            base_study = student['baseline_ability'] * 4 # Max ~4-5 hours
-            study_hours = max(0, np.random.normal(base_study, 1.0))
-            
-            # Simulate attendance (higher ability -> better attendance usually)
-            attendance_prob = 0.7 + (student['baseline_ability'] * 0.3)
-            attended = 1 if random.random() < attendance_prob else 0
-            
-            # Subject focus
-            subjects = ['Math', 'Science', 'English', 'History']
-            focus_subject = random.choice(subjects)
-            
-            logs.append({
-                "student_id": student['student_id'],
-                "date": current_date.date(),
-                "study_hours": round(study_hours, 1),
-                "attendance": attended,
-                "focus_subject": focus_subject,
-                "sleep_hours": round(np.random.normal(7, 1), 1),
-                "screen_time": round(np.random.normal(3, 1.5), 1)
-            })
-            current_date += timedelta(days=1)
-            
-    return pd.DataFrame(logs)
-
-def generate_scores(students_df, logs_df):
-    scores = []
-    # Generate a few tests
-    test_dates = sorted(logs_df['date'].unique())[::7] # Weekly tests
-    
-    for date in test_dates:
-        for _, student in students_df.iterrows():
-            # Calculate recent study effort
-            student_logs = logs_df[(logs_df['student_id'] == student['student_id']) & 
-                                 (logs_df['date'] <= date) & 
-                                 (logs_df['date'] > date - timedelta(days=7))]
-            
-            avg_study = student_logs['study_hours'].mean() if not student_logs.empty else 0
-            avg_sleep = student_logs['sleep_hours'].mean() if not student_logs.empty else 7
-            
-            # Score formula: Ability + Effort + Sleep penalty + Random Noise
-            base_score = student['baseline_ability'] * 60 # Base up to 60
-            effort_bonus = avg_study * 8 # Up to ~32-40
-            sleep_penalty = max(0, (7 - avg_sleep) * 2)
-            
-            final_score = base_score + effort_bonus - sleep_penalty + np.random.normal(0, 5)
-            final_score = min(100, max(0, final_score))
-            
-            scores.append({
-                "student_id": student['student_id'],
-                "date": date,
-                "subject": random.choice(['Math', 'Science', 'English']),
-                "score": round(final_score, 1)
-            })
-            
-    return pd.DataFrame(scores)
+import pandas as pd
+
+SUBJECTS = ['Math', 'Science', 'English', 'History']
+TEST_SUBJECTS = ['Math', 'Science', 'English']
+TEST_EVERY_DAYS = 7
+
+# Partitioned output: one directory per table, one file per shard
+TABLES = ("students", "daily_logs", "scores")
+SHARD_STUDENTS = 50_000
+
+def _rng(seed=None, rng=None):
+    return rng if rng is not None else np.random.default_rng(seed)
+
+def _student_ids(rng, n):
+    """Random (version 4) UUID strings drawn from rng, so they follow the seed."""
+    raw = rng.bytes(16 * n)
+    return [str(uuid.UUID(bytes=raw[i:i + 16], version=4)) for i in range(0, 16 * n, 16)]
+
+def generate_students(n=100, seed=None, rng=None, names=True, start=0):
+    """
+    n students with an id, name, grade level and hidden baseline ability.
+    names=False skips Faker and uses "Student <i>" for i from start (much
+    faster for large n).
+    """
+    rng = _rng(seed, rng)
+    ids = _student_ids(rng, n)
+    if names:
+        from faker import Faker
+        fake = Faker()
+        fake.seed_instance(int(rng.integers(2**32)))
+        student_names = [fake.name() for _ in range(n)]
+    else:
+        student_names = [f"Student {i}" for i in range(start, start + n)]
+    return pd.DataFrame({
+        "student_id": ids,
+        "name": student_names,
+        "grade_level": rng.choice(np.array([9, 10, 11, 12], dtype=np.int8), n),
+        "baseline_ability": rng.normal(0.5, 0.15, n),  # 0 to 1 scale
+    })
+
+def _categorical(codes, categories):
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+def generate_daily_logs(students_df, days=30, end_date=None, seed=None, rng=None):
+    """
+    One log row per student per day for the days+1 days ending at end_date
+    (default: today), ordered by student then date.
+    """
+    rng = _rng(seed, rng)
+    end = pd.Timestamp(end_date if end_date is not None else date.today()).normalize()
+    dates = pd.date_range(end=end, periods=days + 1, freq="D").to_numpy()
+    n, d = len(students_df), len(dates)
+    ability = students_df['baseline_ability'].to_numpy(dtype=np.float64)[:, None]
+
+    # Simulate study habits based on ability + noise (max ~4-5 hours)
+    study_hours = np.maximum(0, rng.normal(ability * 4, 1.0, (n, d)))
+    # Simulate attendance (higher ability -> better attendance usually)
+    attended = rng.random((n, d)) < 0.7 + ability * 0.3
+
+    return pd.DataFrame({
+        "student_id": _categorical(np.repeat(np.arange(n), d), students_df['student_id'].to_numpy()),
+        "date": np.tile(dates, n),
+        "study_hours": study_hours.round(1).astype(np.float32).ravel(),
+        "attendance": attended.astype(np.int8).ravel(),
+        "focus_subject": _categorical(rng.integers(0, len(SUBJECTS), n * d), SUBJECTS),
+        "sleep_hours": rng.normal(7, 1, n * d).round(1).astype(np.float32),
+        "screen_time": rng.normal(3, 1.5, n * d).round(1).astype(np.float32),
+    })
+
+def _student_codes(students_df, ids):
+    """Row position in students_df of every id (-1 if unknown)."""
+    index = pd.Index(students_df['student_id'])
+    if isinstance(ids.dtype, pd.CategoricalDtype):
+        # Look up each category once instead of every row
+        positions = index.get_indexer(ids.cat.categories)
+        codes = ids.cat.codes.to_numpy()
+        return np.where(codes >= 0, positions[codes], -1)
+    return index.get_indexer(ids)
+
+def generate_scores(students_df, logs_df, seed=None, rng=None):
+    """
+    A test every TEST_EVERY_DAYS days of the logged period for every student.
+    The score depends on ability, average study hours and sleep over the 7
+    days up to and including the test date, plus noise. Rows are ordered by
+    test date, then student.
+    """
+    rng = _rng(seed, rng)
+    log_times = pd.to_datetime(logs_df['date']).to_numpy(dtype="datetime64[ns]")
+    test_dates = np.unique(log_times)[::TEST_EVERY_DAYS]
+    n, t = len(students_df), len(test_dates)
+
+    # Tests are at least 7 days apart, so each log day falls in at most one
+    # test's (date - 7 days, date] window: find it and sum per (test, student).
+    week = np.timedelta64(TEST_EVERY_DAYS, "D")
+    test_idx = np.searchsorted(test_dates, log_times, side="left")
+    student = _student_codes(students_df, logs_df['student_id'])
+    in_window = (test_idx < t) & (student >= 0)
+    in_window[in_window] = test_dates[test_idx[in_window]] - log_times[in_window] < week
+    cell = test_idx[in_window] * n + student[in_window]
+
+    def window_sum(values):
+        return np.bincount(cell, weights=values[in_window], minlength=t * n)
+
+    count = np.bincount(cell, minlength=t * n)
+    has_logs = count > 0
+    avg_study = np.divide(window_sum(logs_df['study_hours'].to_numpy(dtype=np.float64)), count,
+                          out=np.zeros(t * n), where=has_logs)
+    avg_sleep = np.divide(window_sum(logs_df['sleep_hours'].to_numpy(dtype=np.float64)), count,
+                          out=np.full(t * n, 7.0), where=has_logs)
+
+    # Score formula: Ability + Effort + Sleep penalty + Random Noise
+    ability = np.tile(students_df['baseline_ability'].to_numpy(dtype=np.float64), t)
+    base_score = ability * 60  # Base up to 60
+    effort_bonus = avg_study * 8  # Up to ~32-40
+    sleep_penalty = np.maximum(0, (7 - avg_sleep) * 2)
+    final_score = base_score + effort_bonus - sleep_penalty + rng.normal(0, 5, t * n)
+
+    return pd.DataFrame({
+        "student_id": _categorical(np.tile(np.arange(n), t), students_df['student_id'].to_numpy()),
+        "date": np.repeat(test_dates, n),
+        "subject": _categorical(rng.integers(0, len(TEST_SUBJECTS), t * n), TEST_SUBJECTS),
+        "score": np.clip(final_score, 0, 100).round(1),
+    })
+
+def generate(n_students=200, days=30, seed=None, end_date=None, names=True, start=0):
+    """students, logs and scores from a single seeded generator."""
+    rng = np.random.default_rng(seed)
+    students = generate_students(n_students, rng=rng, names=names, start=start)
+    logs = generate_daily_logs(students, days, end_date=end_date, rng=rng)
+    scores = generate_scores(students, logs, rng=rng)
+    return students, logs, scores
+
+def partition_path(out_dir, table, shard):
+    return os.path.join(out_dir, table, f"part-{shard:05d}.parquet")
+
+def _generate_shard(out_dir, shard, seed, start, n_students, days, end_date, names):
+    """Worker entry point: generate one shard and write its three partition files."""
+    frames = generate(n_students, days, seed, end_date, names, start)
+    for table, df in zip(TABLES, frames):
+        path = partition_path(out_dir, table, shard)
+        # Dot-prefixed temp file: ignored by Parquet dataset readers until renamed
+        tmp_path = os.path.join(os.path.dirname(path), "." + os.path.basename(path) + ".tmp")
+        df.to_parquet(tmp_path, index=False, compression="zstd")
+        os.replace(tmp_path, path)
+    return [len(df) for df in frames]
+
+def generate_partitioned(out_dir, n_students, days=30, seed=None, end_date=None, names=False,
+                         workers=None, shard_size=SHARD_STUDENTS):
+    """
+    Generate n_students in shards of shard_size on a pool of worker processes,
+    writing out_dir/{students,daily_logs,scores}/part-NNNNN.parquet.
+    The same seed gives the same files whatever the number of workers.
+    Returns a dict with the shard and row counts.
+    """
+    end_date = pd.Timestamp(end_date if end_date is not None else date.today()).normalize()
+    starts = range(0, n_students, shard_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+    for table in TABLES:
+        os.makedirs(os.path.join(out_dir, table), exist_ok=True)
+        for stale in glob.glob(os.path.join(out_dir, table, "part-*.parquet")):
+            os.remove(stale)
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(starts)))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        futures = [pool.submit(_generate_shard, out_dir, shard, seeds[shard], start,
+                               min(shard_size, n_students - start), days, end_date, names)
+                   for shard, start in enumerate(starts)]
+        counts = np.sum([f.result() for f in futures], axis=0) if futures else [0, 0, 0]
+    return {"shards": len(starts), "workers": workers,
+            **{table: int(count) for table, count in zip(TABLES, counts)}}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--end-date", help="last logged day (default: today)")
+    parser.add_argument("--no-names", action="store_true", help="skip Faker names")
+    parser.add_argument("--out-dir", help="write sharded Parquet partitions here instead of three CSVs")
+    parser.add_argument("--workers", type=int, help="worker processes for --out-dir (default: one per core)")
+    parser.add_argument("--shard-size", type=int, default=SHARD_STUDENTS, help="students per partition file")
+    args = parser.parse_args()
 
-if __name__ == "__main__":
     print("Generating synthetic data...")
-    students = generate_students(200)
-    logs = generate_daily_logs(students)
-    scores = generate_scores(students, logs)
-    
+    if args.out_dir:
+        stats = generate_partitioned(args.out_dir, args.students, args.days, args.seed, args.end_date,
+                                     not args.no_names, args.workers, args.shard_size)
+        print(f"Wrote {stats['shards']} shards ({stats['workers']} workers) to {args.out_dir}: "
+              f"{stats['students']:,} students, {stats['daily_logs']:,} logs, {stats['scores']:,} scores.")
+        return
+
+    students, logs, scores = generate(args.students, args.days, args.seed, args.end_date, not args.no_names)
+
     students.to_csv("students.csv", index=False)
     logs.to_csv("daily_logs.csv", index=False)
     scores.to_csv("scores.csv", index=False)
     print("Data generation complete.")
+
+if __name__ == "__main__":
+    main()
@@ -1,86 +1,412 @@
 import sqlite3
 import pandas as pd
 import os
-from sqlalchemy import create_engine
+import queue
+import threading
+from contextlib import contextmanager, nullcontext
+from schema import COLUMNS, apply_schema
 
 DB_NAME = "school_data.db"
 
-def get_engine():
-    return create_engine(f'sqlite:///{DB_NAME}')
+# Cohort used for the natural key (cohort:name) when rows have no external id
+DEFAULT_COHORT = "default"
+
+# Connections kept open per database; extra connections beyond this are
+# closed when released instead of being returned to the pool.
+POOL_SIZE = 8
+
+# Applied to every new connection. WAL lets readers proceed while a writer
+# commits; busy_timeout makes writers wait instead of failing with
+# "database is locked".
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",  # 16 MB page cache per connection
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+]
+
+class ConnectionPool:
+    """A small thread-safe pool of SQLite connections to one database file."""
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+
+    def connect(self):
+        """Open a new connection with the pool's pragmas applied."""
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self.connect()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            if self._idle.qsize() < self.size:
+                self._idle.put(conn)
+            else:
+                conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+_pools = {}
+_initialized = set()
+_lock = threading.Lock()
+
+# Read snapshots shared by every session in this process, keyed by
+# (DB_NAME, query). An entry is served until data_version() changes.
+SNAPSHOT_CACHE = True
+SNAPSHOT_LIMIT = 256
+_snapshots = {}
+_watchers = {}
+_write_counter = 0
+_read_stats = {"queries": 0, "cache_hits": 0}
+
+def get_pool():
+    """The pool for the current DB_NAME (one per process and database file)."""
+    with _lock:
+        if DB_NAME not in _pools:
+            _pools[DB_NAME] = ConnectionPool(DB_NAME)
+        return _pools[DB_NAME]
+
+@contextmanager
+def connection():
+    """Borrow a pooled connection, creating the schema on first use in this process."""
+    with get_pool().connection() as conn:
+        if DB_NAME not in _initialized:
+            _create_schema(conn)
+            _initialized.add(DB_NAME)
+        yield conn
+
+@contextmanager
+def transaction():
+    """
+    Borrow a pooled connection for one transaction: committed when the block
+    exits, rolled back if it raises. Pass it as conn to ingest or
+    upsert_students to make several writes all-or-nothing.
+    """
+    with connection() as conn, conn:
+        yield conn
+    _bump_version()
+
+def close_pool():
+    """Close all pooled connections (tests, shutdown)."""
+    with _lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+        _initialized.clear()
+        for watcher in _watchers.values():
+            watcher.close()
+        _watchers.clear()
+        _snapshots.clear()
+
+def data_version():
+    """
+    Token that changes whenever the students data may have changed: a counter
+    bumped by this module's writes plus SQLite's PRAGMA data_version, read on a
+    dedicated connection, which moves when any other connection (another
+    thread's pooled connection or another process) commits.
+    """
+    with _lock:
+        watcher = _watchers.get(DB_NAME)
+        if watcher is None:
+            watcher = _watchers[DB_NAME] = ConnectionPool(DB_NAME).connect()
+        return (_write_counter, watcher.execute("PRAGMA data_version").fetchone()[0])
+
+def _bump_version():
+    global _write_counter
+    with _lock:
+        _write_counter += 1
+
+def _cached(key, load):
+    """Return load() from the snapshot cache, re-running it only after a write."""
+    if not SNAPSHOT_CACHE:
+        _read_stats["queries"] += 1
+        return load()
+    version = data_version()
+    entry = _snapshots.get((DB_NAME, key))
+    if entry is not None and entry[0] == version:
+        _read_stats["cache_hits"] += 1
+        return entry[1]
+    # Version is read before the query, so a write racing with it only
+    # causes one extra reload on the next call, never a stale hit.
+    value = load()
+    _read_stats["queries"] += 1
+    with _lock:
+        if len(_snapshots) >= SNAPSHOT_LIMIT:
+            _snapshots.clear()
+        _snapshots[(DB_NAME, key)] = (version, value)
+    return value
+
+def read_stats():
+    """Counts of reads answered by SQLite vs. by the snapshot cache."""
+    return dict(_read_stats)
+
+def _create_schema(conn):
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS students (
+                student_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT DEFAULT 'Student',
+                G1 INTEGER,
+                G2 INTEGER,
+                G3 INTEGER,
+                studytime INTEGER,
+                failures INTEGER,
+                absences INTEGER,
+                health INTEGER,
+                freetime INTEGER,
+                goout INTEGER,
+                risk_level INTEGER,
+                predicted_score REAL,
+                student_key TEXT
+            )
+        ''')
+        # Databases created before the natural key get the column added;
+        # their existing rows keep a NULL key (never matched by upserts)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(students)")}
+        if "student_key" not in columns:
+            conn.execute("ALTER TABLE students ADD COLUMN student_key TEXT")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_students_key ON students (student_key)")
+        # Indexes backing the filtered / aggregate queries below
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_students_risk ON students (risk_level)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_students_score ON students (predicted_score)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_students_name ON students (name)")
 
 def init_db():
     """Initialize the database with the students table."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS students (
-            student_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT DEFAULT 'Student',
-            G1 INTEGER,
-            G2 INTEGER,
-            G3 INTEGER,
-            studytime INTEGER,
-            failures INTEGER,
-            absences INTEGER,
-            health INTEGER,
-            freetime INTEGER,
-            goout INTEGER,
-            risk_level INTEGER,
-            predicted_score REAL
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    with get_pool().connection() as conn:
+        _create_schema(conn)
+    _initialized.add(DB_NAME)
+
+def student_key(name, cohort=DEFAULT_COHORT, external_id=None):
+    """Natural key of a student: the external id if known, else cohort + name."""
+    if external_id is not None and not pd.isna(external_id):
+        return f"id:{external_id}"
+    return f"{cohort}:{name}"
+
+def natural_keys(df, cohort=DEFAULT_COHORT):
+    """
+    student_key for every row of df (uses an 'external_id' column if present).
+    Rows with neither an external id nor a name get no key (NaN): they are
+    stored with a NULL key, which never matches, so they are always inserted.
+    """
+    if "name" in df.columns:
+        names = df["name"].astype("string").str.strip()
+    else:
+        names = pd.Series(pd.NA, index=df.index, dtype="string")
+    keys = (cohort + ":" + names).where(names.notna() & (names != ""))
+    if "external_id" in df.columns:
+        external = df["external_id"]
+        if external.dtype.kind == "f" and (external.dropna() % 1 == 0).all():
+            external = external.astype("Int64")  # ids read as float because of gaps
+        keys = keys.where(external.isna(), "id:" + external.astype(str))
+    return keys
 
 def add_student(data):
     """
     Add a single student record.
     data: dict with keys matching columns
+    With an 'external_id' the record is upserted on that id; otherwise it
+    is always inserted as a new row.
+    Raises SchemaError if a given value is outside its declared range.
     """
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
+    apply_schema(pd.DataFrame([{k: v for k, v in data.items() if k in COLUMNS}]))
     # Ensure all fields are present with defaults
     fields = ["name", "G1", "G2", "G3", "studytime", "failures", "absences", "health", "freetime", "goout", "risk_level", "predicted_score"]
     values = [data.get(f, 0) if f != "name" else data.get(f, "Student") for f in fields]
-    
-    c.execute(f'''
-        INSERT INTO students ({", ".join(fields)})
-        VALUES ({", ".join(["?"] * len(fields))})
-    ''', values)
-    
-    conn.commit()
-    conn.close()
+    conflict = ""
+    if data.get("external_id") is not None:
+        fields.append("student_key")
+        values.append(student_key(None, external_id=data["external_id"]))
+        conflict = _upsert_clause(fields)
+
+    with connection() as conn, conn:
+        conn.execute(f'''
+            INSERT INTO students ({", ".join(fields)})
+            VALUES ({", ".join(["?"] * len(fields))}) {conflict}
+        ''', values)
+    _bump_version()
+
+# Columns accepted from a DataFrame by bulk_insert / ingest
+DB_COLUMNS = ["student_id", "name", "G1", "G2", "G3", "studytime", "failures", "absences", "health", "freetime", "goout", "risk_level", "predicted_score", "student_key"]
+
+# Rows per executemany call, and the size from which ingest drops the
+# secondary indexes and rebuilds them once at the end by default.
+INGEST_CHUNK_SIZE = 50_000
+REBUILD_INDEXES_ABOVE = 100_000
 
 def bulk_insert(df):
     """
     Insert a dataframe of students.
     df: pandas DataFrame
     """
-    engine = get_engine()
+    ingest(df)
+
+def _upsert_clause(columns):
+    """ON CONFLICT clause updating every supplied column of an existing student."""
+    updates = ", ".join(f"{col} = excluded.{col}" for col in columns if col not in ("student_id", "student_key"))
+    return f"ON CONFLICT (student_key) DO UPDATE SET {updates}"
+
+def upsert_students(df, cohort=DEFAULT_COHORT, **kwargs):
+    """
+    Insert or update a dataframe of students by natural key (see natural_keys),
+    so uploading the same students again updates them in place. A
+    student_key already set in df is kept (e.g. keys derived from the file
+    for nameless uploads); rows without any key are inserted as new students.
+    Takes the same keyword arguments as ingest. Returns the number of rows written.
+    """
+    keys = natural_keys(df, cohort)
+    if "student_key" in df.columns:
+        keys = df["student_key"].astype("string").fillna(keys)
+    df = df.assign(student_key=keys)
+    return ingest(df, upsert=True, **kwargs)
+
+def _column_values(series):
+    """Python values for sqlite3 (numpy scalars are not accepted), NaN as NULL."""
+    if series.isna().any():
+        return series.astype(object).where(series.notna(), None).tolist()
+    return series.tolist()
 
+def ingest(df, chunk_size=INGEST_CHUNK_SIZE, drop_indexes=None, progress=None, upsert=False, conn=None):
+    """
+    Insert a dataframe of students in one transaction using executemany.
+    The INSERT is prepared once and reused for every chunk of chunk_size rows.
+    drop_indexes: drop the students indexes first and rebuild them after the
+        load (faster for large loads); None decides by REBUILD_INDEXES_ABOVE.
+    progress: optional callable(rows_done, rows_total), called after each chunk.
+    upsert: update rows whose student_key already exists instead of failing
+        (df must have a student_key column).
+    conn: write inside this open transaction (see transaction()) instead of
+        committing a transaction of its own.
+    Returns the number of rows written.
+    """
     # Only keep columns that exist in the database schema
-    db_columns = ["student_id", "name", "G1", "G2", "G3", "studytime", "failures", "absences", "health", "freetime", "goout", "risk_level", "predicted_score"]
-    df_filtered = df[[col for col in db_columns if col in df.columns]]
+    columns = [col for col in DB_COLUMNS if col in df.columns]
+    total = len(df)
+    if drop_indexes is None:
+        drop_indexes = total >= REBUILD_INDEXES_ABOVE
+    sql = f"INSERT INTO students ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})"
+    if upsert:
+        sql += " " + _upsert_clause(columns)
 
-    df_filtered.to_sql('students', engine, if_exists='append', index=False)
+    with nullcontext(conn) if conn is not None else transaction() as conn:
+        indexes = []
+        if drop_indexes:
+            indexes = conn.execute(
+                # The unique key index stays: upserts need it and it enforces uniqueness
+                "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'students' "
+                "AND sql IS NOT NULL AND sql NOT LIKE 'CREATE UNIQUE%'"
+            ).fetchall()
+            for name, _ in indexes:
+                conn.execute(f"DROP INDEX {name}")
+        for start in range(0, total, chunk_size):
+            chunk = df.iloc[start:start + chunk_size]
+            conn.executemany(sql, zip(*[_column_values(chunk[col]) for col in columns]))
+            if progress:
+                progress(start + len(chunk), total)
+        for _, index_sql in indexes:
+            conn.execute(index_sql)
+    return total
 
 def get_all_students():
-    """Return all students as a DataFrame."""
-    engine = get_engine()
-    try:
-        df = pd.read_sql("SELECT * FROM students", engine)
-    except:
-        df = pd.DataFrame()
-    return df
+    """
+    Return all students as a DataFrame.
+    Served from the shared snapshot until the table changes; callers get
+    their own copy so they can add or modify columns freely.
+    """
+    def load():
+        try:
+            with connection() as conn:
+                df = pd.read_sql("SELECT * FROM students", conn)
+        except:
+            df = pd.DataFrame()
+        return apply_schema(df, validate=False)
+    return _cached(("all",), load).copy()
+
+def _filters(risk_level=None, min_score=None, max_score=None, name_prefix=None):
+    """Build a WHERE clause (and its parameters) from optional filters."""
+    clauses, params = [], []
+    if risk_level is not None:
+        clauses.append("risk_level = ?")
+        params.append(int(risk_level))
+    if min_score is not None:
+        clauses.append("predicted_score >= ?")
+        params.append(float(min_score))
+    if max_score is not None:
+        clauses.append("predicted_score <= ?")
+        params.append(float(max_score))
+    if name_prefix:
+        # Range scan instead of LIKE so the name index can be used
+        clauses.append("name >= ? AND name < ?")
+        params += [name_prefix, name_prefix + "\U0010ffff"]
+    return clauses, params
+
+def query_students(risk_level=None, min_score=None, max_score=None, name_prefix=None,
+                   after_id=None, limit=50):
+    """
+    Return one page of students matching the filters, ordered by student_id.
+    Pass the last student_id of a page as after_id to get the next page
+    (keyset pagination, so deep pages cost the same as the first).
+    """
+    clauses, params = _filters(risk_level, min_score, max_score, name_prefix)
+    if after_id is not None:
+        clauses.append("student_id > ?")
+        params.append(int(after_id))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    def load():
+        with connection() as conn:
+            df = pd.read_sql(f"SELECT * FROM students {where} ORDER BY student_id LIMIT ?",
+                             conn, params=params + [int(limit)])
+        return apply_schema(df, validate=False)
+    return _cached(("page", where, tuple(params), int(limit)), load).copy()
+
+def get_student(student_id):
+    """Return one student as a Series, or None if it does not exist."""
+    def load():
+        with connection() as conn:
+            df = pd.read_sql("SELECT * FROM students WHERE student_id = ?", conn, params=[int(student_id)])
+        return None if df.empty else apply_schema(df, validate=False).iloc[0]
+    row = _cached(("student", int(student_id)), load)
+    return None if row is None else row.copy()
+
+def count_students(risk_level=None, min_score=None, max_score=None, name_prefix=None):
+    """Number of students matching the filters."""
+    clauses, params = _filters(risk_level, min_score, max_score, name_prefix)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    def load():
+        with connection() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM students {where}", params).fetchone()[0]
+    return _cached(("count", where, tuple(params)), load)
+
+def risk_distribution():
+    """Return {risk_level: count} for the whole table."""
+    def load():
+        with connection() as conn:
+            rows = conn.execute(
+                "SELECT risk_level, COUNT(*) FROM students WHERE risk_level IS NOT NULL GROUP BY risk_level"
+            ).fetchall()
+        return {int(level): count for level, count in rows}
+    return dict(_cached(("risk",), load))
 
 def clear_db():
     """Clear all data (for testing/reset)."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("DELETE FROM students")
-    conn.commit()
-    conn.close()
-
-# Initialize on import
-init_db()
+    with connection() as conn, conn:
+        conn.execute("DELETE FROM students")
+    _bump_version()
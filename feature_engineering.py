@@ -1,41 +1,283 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 import pandas as pd
 import numpy as np
+import storage
 
-def load_data():
-    students = pd.read_csv("students.csv")
-    logs = pd.read_csv("daily_logs.csv")
-    scores = pd.read_csv("scores.csv")
+# Look-back windows (in days) used by the rolling features
+WINDOWS = (7, 14, 30)
+# Span (in log rows, i.e. days) of the exponentially weighted averages
+EWM_SPAN = 7
+# Previous scores exposed as features: prev_score is lag 1, score_lag_N the N-th
+SCORE_LAGS = (1, 2, 3)
+
+FEATURE_COLUMNS = [
+    "student_id", "exam_date", "subject", "grade_level", "avg_study_7d", "avg_study_30d",
+    "attendance_rate_30d", "study_trend_14d", "ewm_study", "ewm_attendance",
+    "avg_sleep_7d", "avg_sleep_30d", "avg_screen_time_7d", "avg_screen_time_30d",
+    "study_attendance_interaction", "prev_score"
+] + [f"score_lag_{n}" for n in SCORE_LAGS[1:]] + ["target_score"]
+
+# Student partitions per worker process in compute_features(workers=N): more,
+# smaller partitions even out the load when some students have more rows
+PARTITIONS_PER_WORKER = 4
+
+def load_data(data_dir=None):
+    """
+    students, logs and scores from the CSV/Parquet files in the working
+    directory, or from the students/, daily_logs/ and scores/ partition
+    directories under data_dir (see data_generator.generate_partitioned).
+    """
+    if data_dir is None:
+        paths = ["students.csv", "daily_logs.csv", "scores.csv"]
+    else:
+        paths = [os.path.join(data_dir, name) for name in ("students", "daily_logs", "scores")]
+    students, logs, scores = (storage.load(path) for path in paths)
     return students, logs, scores
 
-def compute_features(students, logs, scores):
+def _to_ns(values):
+    """Datetime-like values -> int64 nanoseconds."""
+    return pd.to_datetime(values).to_numpy(dtype="datetime64[ns]").view("int64")
+
+def _lag_name(n):
+    return "prev_score" if n == 1 else f"score_lag_{n}"
+
+def _window_features(log_codes, log_times, study, attendance, sleep, screen_time,
+                     score_codes, score_times, score_values):
+    """
+    Core of the vectorized engine, operating on plain NumPy arrays.
+
+    Logs must be sorted by (code, time). For every score row the window bounds
+    are found with an as-of lookup (searchsorted on a combined (code, time)
+    key) and the window statistics are read from prefix sums, so the cost is
+    O((logs + scores) log logs) instead of O(logs x scores). The exponentially
+    weighted averages are one grouped pass over the sorted logs, read as of
+    the last log before each exam, and previous scores are an as-of lookup
+    into the scores sorted the same way.
+    """
+    day = np.int64(86_400_000_000_000)
+    score_times = np.asarray(score_times, dtype=np.int64)
+    thresholds = [score_times - w * day for w in WINDOWS]
+
+    # Dense-rank every timestamp we compare against so the combined key
+    # code * R + rank cannot overflow int64.
+    all_times = np.unique(np.concatenate([log_times, score_times] + thresholds))
+    R = np.int64(len(all_times) + 1)
+
+    def key(codes, times):
+        return codes.astype(np.int64) * R + np.searchsorted(all_times, times)
+
+    log_keys = key(log_codes, log_times)
+    hi = np.searchsorted(log_keys, key(score_codes, score_times), side="left")
+    lo_all = np.searchsorted(log_keys, score_codes.astype(np.int64) * R, side="left")
+    lo = {w: np.searchsorted(log_keys, key(score_codes, t), side="left")
+          for w, t in zip(WINDOWS, thresholds)}
+
+    # Position of each log row within its student's block (used as the x axis
+    # of the trend regression, like np.arange(len(window)) in the loop).
+    block_start = np.searchsorted(log_keys, log_codes.astype(np.int64) * R, side="left")
+    local_pos = (np.arange(len(log_keys)) - block_start).astype(np.float64)
+
+    def prefix(values):
+        return np.concatenate([[0.0], np.cumsum(values, dtype=np.float64)])
+
+    P_study = prefix(study)
+    P_attend = prefix(attendance)
+    P_sleep = prefix(sleep)
+    P_screen = prefix(screen_time)
+    P_xy = prefix(local_pos * study)
+
+    def window_mean(P, w):
+        n = hi - lo[w]
+        total = P[hi] - P[lo[w]]
+        return np.divide(total, n, out=np.zeros(len(n)), where=n > 0)
+
+    # Closed-form OLS slope over x = 0..n-1 within the 14 day window
+    n = (hi - lo[14]).astype(np.float64)
+    sum_y = P_study[hi] - P_study[lo[14]]
+    x0 = local_pos[np.minimum(lo[14], len(local_pos) - 1)] if len(local_pos) else np.zeros(len(n))
+    sum_xy = (P_xy[hi] - P_xy[lo[14]]) - x0 * sum_y
+    sum_x = n * (n - 1) / 2
+    denom = n * n * (n * n - 1) / 12
+    slope = np.divide(n * sum_xy - sum_x * sum_y, denom, out=np.zeros(len(n)), where=n > 1)
+
+    # Logs are contiguous per student, so the grouped EWM keeps their order
+    has_history = hi > lo_all
+    last = np.maximum(hi - 1, 0)
+    ewm = (pd.DataFrame({"study": study, "attendance": attendance})
+           .groupby(log_codes, sort=False).ewm(span=EWM_SPAN).mean().to_numpy())
+    as_of = ewm[last] if len(ewm) else np.zeros((len(hi), 2))
+
+    # N-th previous score: N rows before the exam's first (code, time) match
+    score_keys = key(score_codes, score_times)
+    score_order = np.argsort(score_keys, kind="stable")
+    sorted_keys = score_keys[score_order]
+    sorted_values = np.asarray(score_values, dtype=np.float64)[score_order]
+    first = np.searchsorted(sorted_keys, score_keys, side="left")
+    student_first = np.searchsorted(sorted_keys, score_codes.astype(np.int64) * R, side="left")
+    lags = {}
+    for lag in SCORE_LAGS:
+        pos = first - lag
+        lags[_lag_name(lag)] = np.where(pos >= student_first, sorted_values[np.maximum(pos, 0)], np.nan)
+
+    return {
+        "has_history": has_history,
+        "avg_study_7d": window_mean(P_study, 7),
+        "avg_study_30d": window_mean(P_study, 30),
+        "attendance_rate_30d": window_mean(P_attend, 30),
+        "study_trend_14d": slope,
+        "ewm_study": np.where(has_history, as_of[:, 0], 0.0),
+        "ewm_attendance": np.where(has_history, as_of[:, 1], 0.0),
+        "avg_sleep_7d": window_mean(P_sleep, 7),
+        "avg_sleep_30d": window_mean(P_sleep, 30),
+        "avg_screen_time_7d": window_mean(P_screen, 7),
+        "avg_screen_time_30d": window_mean(P_screen, 30),
+        **lags,
+    }
+
+_LOG_INPUTS = ("log_codes", "log_times", "study", "attendance", "sleep", "screen_time")
+_SCORE_INPUTS = ("score_codes", "score_times", "score_values")
+
+def _partition_features(array_dir, log_start, log_stop, score_start, score_stop):
+    """Worker entry point: _window_features on one partition's slice of the memory-mapped inputs."""
+    def load(name, start, stop):
+        return np.load(os.path.join(array_dir, name + ".npy"), mmap_mode="r")[start:stop]
+
+    log_arrays = [load(name, log_start, log_stop) for name in _LOG_INPUTS]
+    score_arrays = [load(name, score_start, score_stop) for name in _SCORE_INPUTS]
+    return _window_features(*log_arrays, *score_arrays)
+
+def _parallel_window_features(log_arrays, score_arrays, workers):
+    """
+    _window_features over hash partitions of the students, in worker processes.
+    log_arrays / score_arrays are its inputs in _LOG_INPUTS / _SCORE_INPUTS order.
+
+    Students go to partition code % n_parts. Logs and scores are reordered so
+    each partition is one contiguous slice (logs stay sorted by (code, time)
+    inside it) and saved once as .npy files that the workers memory-map, so
+    only slice bounds are pickled to them. Results are scattered back into
+    score order.
+    """
+    log_codes, score_codes = log_arrays[0], score_arrays[0]
+    n_parts = workers * PARTITIONS_PER_WORKER
+    log_part, score_part = log_codes % n_parts, score_codes % n_parts
+    log_order = np.argsort(log_part, kind="stable")
+    score_order = np.argsort(score_part, kind="stable")
+    log_bounds = np.searchsorted(log_part[log_order], np.arange(n_parts + 1))
+    score_bounds = np.searchsorted(score_part[score_order], np.arange(n_parts + 1))
+
+    inputs = {name: values[log_order] for name, values in zip(_LOG_INPUTS, log_arrays)}
+    inputs.update({name: values[score_order] for name, values in zip(_SCORE_INPUTS, score_arrays)})
+    parts = [p for p in range(n_parts) if score_bounds[p + 1] > score_bounds[p]]
+    with tempfile.TemporaryDirectory(prefix="features-") as array_dir:
+        for name, values in inputs.items():
+            np.save(os.path.join(array_dir, name + ".npy"), values)
+        del inputs
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+            futures = [pool.submit(_partition_features, array_dir, log_bounds[p], log_bounds[p + 1],
+                                   score_bounds[p], score_bounds[p + 1]) for p in parts]
+            results = [f.result() for f in futures]
+
+    feats = {}
+    for p, result in zip(parts, results):
+        rows = score_order[score_bounds[p]:score_bounds[p + 1]]
+        for name, values in result.items():
+            if name not in feats:
+                feats[name] = np.zeros(len(score_codes), dtype=values.dtype)
+            feats[name][rows] = values
+    if not feats:
+        feats = _window_features(*log_arrays, *score_arrays)
+    return feats
+
+def compute_features(students, logs, scores, workers=None):
+    """
+    Vectorized feature engine.
+
+    Produces the same rows and columns as compute_features_loop: for every
+    score, features are computed from logs strictly before the exam date and
+    scores without any prior logs are dropped.
+    workers > 1 computes the windows on hash partitions of the students in
+    that many processes (same result).
+    """
+    codes, _ = pd.factorize(pd.concat([logs['student_id'], scores['student_id']], ignore_index=True))
+    log_codes, score_codes = codes[:len(logs)], codes[len(logs):]
+
+    log_times = _to_ns(logs['date'])
+    order = np.lexsort((log_times, log_codes))
+
+    log_arrays = [log_codes[order], log_times[order]] + [
+        logs[col].to_numpy(dtype=np.float64)[order]
+        for col in ('study_hours', 'attendance', 'sleep_hours', 'screen_time')
+    ]
+    score_arrays = [score_codes, _to_ns(scores['date']), scores['score'].to_numpy(dtype=np.float64)]
+    if workers and workers > 1:
+        feats = _parallel_window_features(log_arrays, score_arrays, workers)
+    else:
+        feats = _window_features(*log_arrays, *score_arrays)
+
+    keep = feats.pop("has_history")
+    scored = scores[keep]
+    grade_levels = students.drop_duplicates('student_id').set_index('student_id')['grade_level']
+
+    features_df = pd.DataFrame({
+        "student_id": scored['student_id'].to_numpy(),
+        "exam_date": pd.to_datetime(scored['date']).to_numpy(),
+        "subject": scored['subject'].to_numpy(),
+        "grade_level": scored['student_id'].map(grade_levels).to_numpy(),
+        **{name: values[keep] for name, values in feats.items()},
+    })
+    features_df["study_attendance_interaction"] = features_df["avg_study_30d"] * features_df["attendance_rate_30d"]
+    features_df["target_score"] = scored['score'].to_numpy()
+    return features_df[FEATURE_COLUMNS]
+
+def compute_features_loop(students, logs, scores):
+    """Reference row-by-row implementation, kept for benchmarking and tests."""
     # Convert dates
     logs['date'] = pd.to_datetime(logs['date'])
     scores['date'] = pd.to_datetime(scores['date'])
-    
+
     feature_rows = []
-    
-    # We want to create a training dataset. 
+
+    # We want to create a training dataset.
     # For each score (target), we compute features based on data available BEFORE that score.
-    
+
     for _, score_row in scores.iterrows():
         student_id = score_row['student_id']
         exam_date = score_row['date']
-        
+
         # Filter logs prior to exam
         prior_logs = logs[(logs['student_id'] == student_id) & (logs['date'] < exam_date)]
-        
+
         if prior_logs.empty:
             continue
-            
+
         # 1. Rolling Averages (7, 14, 30 days)
         last_7d = prior_logs[prior_logs['date'] >= exam_date - pd.Timedelta(days=7)]
         last_30d = prior_logs[prior_logs['date'] >= exam_date - pd.Timedelta(days=30)]
-        
+
         avg_study_7d = last_7d['study_hours'].mean() if not last_7d.empty else 0
         avg_study_30d = last_30d['study_hours'].mean() if not last_30d.empty else 0
-        
+
         attendance_rate_30d = last_30d['attendance'].mean() if not last_30d.empty else 0
-        
+
+        # Sleep and screen time over the same windows
+        avg_sleep_7d = last_7d['sleep_hours'].mean() if not last_7d.empty else 0
+        avg_sleep_30d = last_30d['sleep_hours'].mean() if not last_30d.empty else 0
+        avg_screen_time_7d = last_7d['screen_time'].mean() if not last_7d.empty else 0
+        avg_screen_time_30d = last_30d['screen_time'].mean() if not last_30d.empty else 0
+
+        # Exponentially weighted averages over the whole history
+        prior_sorted = prior_logs.sort_values('date')
+        ewm_study = prior_sorted['study_hours'].astype(float).ewm(span=EWM_SPAN).mean().iloc[-1]
+        ewm_attendance = prior_sorted['attendance'].astype(float).ewm(span=EWM_SPAN).mean().iloc[-1]
+
+        # Previous scores, most recent first
+        prior_scores = scores[(scores['student_id'] == student_id) & (scores['date'] < exam_date)]
+        previous = prior_scores.sort_values('date', kind='stable')['score'].to_numpy()[::-1]
+        lags = {_lag_name(n): previous[n - 1] if len(previous) >= n else np.nan for n in SCORE_LAGS}
+
         # 2. Trends
         # Slope of study hours in last 14 days
         last_14d = prior_logs[prior_logs['date'] >= exam_date - pd.Timedelta(days=14)]
@@ -46,13 +288,13 @@ def compute_features(students, logs, scores):
             slope = np.polyfit(x, y, 1)[0]
         else:
             slope = 0
-            
+
         # 3. Interactions
         study_attendance_interaction = avg_study_30d * attendance_rate_30d
-        
+
         # 4. Static features
         student_info = students[students['student_id'] == student_id].iloc[0]
-        
+
         feature_rows.append({
             "student_id": student_id,
             "exam_date": exam_date,
@@ -62,16 +304,41 @@ def compute_features(students, logs, scores):
             "avg_study_30d": avg_study_30d,
             "attendance_rate_30d": attendance_rate_30d,
             "study_trend_14d": slope,
+            "ewm_study": ewm_study,
+            "ewm_attendance": ewm_attendance,
+            "avg_sleep_7d": avg_sleep_7d,
+            "avg_sleep_30d": avg_sleep_30d,
+            "avg_screen_time_7d": avg_screen_time_7d,
+            "avg_screen_time_30d": avg_screen_time_30d,
             "study_attendance_interaction": study_attendance_interaction,
-            "prev_score": 0, # Placeholder, could be improved with lag features
+            **lags,
             "target_score": score_row['score']
         })
-        
-    return pd.DataFrame(feature_rows)
+
+    return pd.DataFrame(feature_rows, columns=FEATURE_COLUMNS)
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Compute the feature table from students/daily_logs/scores.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only recompute features affected by new logs (uses the persisted feature store)")
+    parser.add_argument("--data-dir", help="read partitioned output of data_generator.py --out-dir")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes computing hash partitions of the students (0: one per core)")
+    args = parser.parse_args()
+
     print("Computing features...")
-    students, logs, scores = load_data()
-    features_df = compute_features(students, logs, scores)
+    students, logs, scores = load_data(args.data_dir)
+    if args.incremental:
+        from feature_store import FeatureStore
+        store = FeatureStore()
+        stats = store.update(students, logs, scores)
+        print(f"Appended {stats['new_logs']} logs / {stats['new_scores']} scores, "
+              f"recomputed {stats['features_recomputed']} rows for {stats['students_affected']} students.")
+        features_df = store.features()
+        store.close()
+    else:
+        workers = args.workers or os.cpu_count() or 1
+        features_df = compute_features(students, logs, scores, workers=workers)
     features_df.to_csv("features.csv", index=False)
     print(f"Features computed: {len(features_df)} rows.")
@@ -0,0 +1,287 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+from feature_engineering import EWM_SPAN, FEATURE_COLUMNS, SCORE_LAGS, WINDOWS, compute_features
+
+STORE_NAME = "feature_store.db"
+
+LOG_COLUMNS = ["student_id", "date", "study_hours", "attendance", "focus_subject", "sleep_hours", "screen_time"]
+SCORE_COLUMNS = ["student_id", "date", "subject", "score"]
+SCORE_KEY = ["student_id", "date", "subject"]
+# Running EWM state stored with every log: numerators and denominator of the
+# adjust=True average over the student's logs up to and including that day
+EWM_COLUMNS = ["ewm_study_num", "ewm_attendance_num", "ewm_den"]
+_DECAY = 1 - 2 / (EWM_SPAN + 1)
+
+def _day(values):
+    """Normalize dates to 'YYYY-MM-DD' text (daily granularity, sorts correctly)."""
+    return pd.to_datetime(values).dt.strftime("%Y-%m-%d")
+
+def _extend_ewm(logs, seeds):
+    """
+    EWM_COLUMNS for logs sorted by (student_id, date), continuing each
+    student's stored state (seeds: DataFrame indexed by student_id with
+    EWM_COLUMNS; students without a seed start from zero).
+    """
+    step = logs.groupby('student_id', sort=False).cumcount().to_numpy() + 1
+    decay = _DECAY ** step
+    # adjust=True weights over the new logs alone sum to (1 - d^k) / (1 - d)
+    den = (1 - decay) / (1 - _DECAY)
+    means = (logs[['study_hours', 'attendance']].astype(float)
+             .groupby(logs['student_id'], sort=False).ewm(span=EWM_SPAN).mean().to_numpy())
+    seed = seeds.reindex(logs['student_id']).fillna(0.0).to_numpy()
+    return pd.DataFrame({
+        "ewm_study_num": means[:, 0] * den + decay * seed[:, 0],
+        "ewm_attendance_num": means[:, 1] * den + decay * seed[:, 1],
+        "ewm_den": den + decay * seed[:, 2],
+    }, index=logs.index)
+
+class FeatureStore:
+    """
+    Persisted feature table keyed by (student_id, exam_date).
+
+    Logs and scores are appended to the store as they arrive. Each student has
+    a high-water mark (the last log date seen), so handing update() a full
+    daily_logs.csv only ingests the new rows, and only exams that a new log
+    or score can influence are recomputed. Every stored log carries the
+    student's running EWM state, so a recompute reads only one look-back
+    window of logs and the last few scores instead of the whole history.
+    """
+
+    def __init__(self, path=STORE_NAME):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self._init_schema()
+
+    def _init_schema(self):
+        c = self.conn
+        c.executescript('''
+            CREATE TABLE IF NOT EXISTS students (
+                student_id TEXT PRIMARY KEY,
+                grade_level INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS logs (
+                student_id TEXT,
+                date TEXT,
+                study_hours REAL,
+                attendance INTEGER,
+                focus_subject TEXT,
+                sleep_hours REAL,
+                screen_time REAL,
+                ewm_study_num REAL,
+                ewm_attendance_num REAL,
+                ewm_den REAL,
+                PRIMARY KEY (student_id, date)
+            );
+            CREATE TABLE IF NOT EXISTS scores (
+                student_id TEXT,
+                date TEXT,
+                subject TEXT,
+                score REAL,
+                PRIMARY KEY (student_id, date, subject)
+            );
+            CREATE TABLE IF NOT EXISTS watermarks (
+                student_id TEXT PRIMARY KEY,
+                last_log_date TEXT
+            );
+            CREATE TABLE IF NOT EXISTS features (
+                student_id TEXT,
+                exam_date TEXT,
+                subject TEXT,
+                grade_level INTEGER,
+                avg_study_7d REAL,
+                avg_study_30d REAL,
+                attendance_rate_30d REAL,
+                study_trend_14d REAL,
+                ewm_study REAL,
+                ewm_attendance REAL,
+                avg_sleep_7d REAL,
+                avg_sleep_30d REAL,
+                avg_screen_time_7d REAL,
+                avg_screen_time_30d REAL,
+                study_attendance_interaction REAL,
+                prev_score REAL,
+                score_lag_2 REAL,
+                score_lag_3 REAL,
+                target_score REAL,
+                PRIMARY KEY (student_id, exam_date, subject)
+            );
+        ''')
+        c.commit()
+        # Several tests on one day (different subjects) are separate rows
+        for table, key in (("scores", SCORE_KEY), ("features", ["student_id", "exam_date", "subject"])):
+            self._rekey(table, key)
+        # Stores created before a feature was added get the column, and every
+        # stored row is recomputed so it is filled in
+        existing = {row[1] for row in c.execute("PRAGMA table_info(features)")}
+        missing = [col for col in FEATURE_COLUMNS if col not in existing]
+        log_columns = {row[1] for row in c.execute("PRAGMA table_info(logs)")}
+        missing_state = [col for col in EWM_COLUMNS if col not in log_columns]
+        if missing:
+            with c:
+                for col in missing:
+                    c.execute(f"ALTER TABLE features ADD COLUMN {col} REAL")
+        if missing_state:
+            self._backfill_ewm(missing_state)
+        if missing or missing_state:
+            since = pd.Series("", index=[r[0] for r in c.execute("SELECT student_id FROM students")], dtype=object)
+            if len(since):
+                self._recompute(since)
+
+    def _rekey(self, table, key):
+        """Rebuild a table of an older store whose primary key is not `key`."""
+        c = self.conn
+        info = c.execute(f"PRAGMA table_info({table})").fetchall()
+        if [row[1] for row in sorted(info, key=lambda row: row[5]) if row[5]] == key:
+            return
+        columns = ", ".join(f"{row[1]} {row[2]}" for row in info)
+        names = ", ".join(row[1] for row in info)
+        with c:
+            c.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+            c.execute(f"CREATE TABLE {table} ({columns}, PRIMARY KEY ({', '.join(key)}))")
+            c.execute(f"INSERT OR REPLACE INTO {table} ({names}) SELECT {names} FROM {table}_old")
+            c.execute(f"DROP TABLE {table}_old")
+
+    def _backfill_ewm(self, missing):
+        """One-off pass adding and filling the EWM state of every stored log (older stores)."""
+        c = self.conn
+        logs = pd.read_sql("SELECT student_id, date, study_hours, attendance FROM logs "
+                           "ORDER BY student_id, date", c)
+        state = _extend_ewm(logs, pd.DataFrame(columns=EWM_COLUMNS, dtype=float))
+        with c:
+            for col in missing:
+                c.execute(f"ALTER TABLE logs ADD COLUMN {col} REAL")
+            c.executemany(
+                f"UPDATE logs SET {', '.join(f'{col} = ?' for col in EWM_COLUMNS)} WHERE student_id = ? AND date = ?",
+                pd.concat([state, logs[['student_id', 'date']]], axis=1).itertuples(index=False, name=None)
+            )
+
+    def close(self):
+        self.conn.close()
+
+    def watermarks(self):
+        """Return {student_id: last_log_date} for every student seen."""
+        return dict(self.conn.execute("SELECT student_id, last_log_date FROM watermarks").fetchall())
+
+    def _new_logs(self, logs):
+        """Rows of logs that are past their student's high-water mark."""
+        logs = logs.assign(student_id=logs['student_id'].astype(str), date=_day(logs['date']))
+        marks = pd.Series(self.watermarks(), dtype=object)
+        mark = logs['student_id'].map(marks).fillna("").astype(str)
+        return logs[logs['date'] > mark]
+
+    def _new_scores(self, scores):
+        scores = scores.assign(student_id=scores['student_id'].astype(str), date=_day(scores['date']))
+        scores = scores.assign(subject=scores['subject'].astype(str))
+        known = pd.read_sql("SELECT student_id, date, subject FROM scores", self.conn)
+        merged = scores.merge(known, on=SCORE_KEY, how="left", indicator=True)
+        return scores[(merged['_merge'] == "left_only").to_numpy()]
+
+    def update(self, students, logs, scores):
+        """
+        Ingest new logs/scores and recompute only the affected exams.
+        Returns a dict with counts of what was appended and recomputed.
+        """
+        new_logs = self._new_logs(logs)
+        new_scores = self._new_scores(scores)
+
+        # Earliest change per student: exams after it may see different windows
+        changes = pd.concat([
+            new_logs[['student_id', 'date']],
+            new_scores[['student_id', 'date']].assign(date=lambda d: _day(pd.to_datetime(d['date']) - pd.Timedelta(days=1)))
+        ])
+        since = changes.groupby('student_id')['date'].min()
+
+        c = self.conn
+        # New logs are past the watermark, so their EWM state continues from
+        # the stored state of each student's latest log
+        new_logs = new_logs.sort_values(['student_id', 'date'], kind='stable')
+        seeds = pd.read_sql(f'''
+            SELECT l.student_id, {', '.join(EWM_COLUMNS)} FROM logs l
+            JOIN watermarks w ON w.student_id = l.student_id AND w.last_log_date = l.date
+        ''', c).set_index('student_id')
+        new_logs = pd.concat([new_logs, _extend_ewm(new_logs, seeds)], axis=1)
+        with c:
+            c.executemany(
+                "INSERT OR REPLACE INTO students (student_id, grade_level) VALUES (?, ?)",
+                students[['student_id', 'grade_level']].itertuples(index=False, name=None)
+            )
+            new_logs.reindex(columns=LOG_COLUMNS + EWM_COLUMNS).to_sql('logs', c, if_exists='append', index=False)
+            # A score repeated within the batch replaces the earlier one instead of aborting the update
+            c.executemany(
+                f"INSERT OR REPLACE INTO scores ({', '.join(SCORE_COLUMNS)}) VALUES (?, ?, ?, ?)",
+                new_scores.reindex(columns=SCORE_COLUMNS).astype(object).itertuples(index=False, name=None)
+            )
+            c.executemany('''
+                INSERT INTO watermarks (student_id, last_log_date) VALUES (?, ?)
+                ON CONFLICT(student_id) DO UPDATE SET last_log_date = MAX(last_log_date, excluded.last_log_date)
+            ''', new_logs.groupby('student_id')['date'].max().items())
+
+        recomputed = self._recompute(since) if len(since) else 0
+        return {"new_logs": len(new_logs), "new_scores": len(new_scores),
+                "students_affected": len(since), "features_recomputed": recomputed}
+
+    def _recompute(self, since):
+        """
+        Recompute the exams after each student's `since` day, reading only
+        what they depend on: logs from max(WINDOWS) days before `since` (plus
+        the latest earlier log, which carries the EWM state and marks that
+        history exists), the scores after `since` and the last SCORE_LAGS
+        scores up to it.
+        """
+        c = self.conn
+        log_from = since.map(lambda day: (pd.Timestamp(day) - pd.Timedelta(days=max(WINDOWS))).strftime("%Y-%m-%d")
+                             if day else "")
+        c.execute("DROP TABLE IF EXISTS temp.affected")
+        c.execute("CREATE TEMP TABLE affected (student_id TEXT PRIMARY KEY, since TEXT, log_from TEXT)")
+        c.executemany("INSERT INTO affected VALUES (?, ?, ?)",
+                      zip(since.index, since.to_numpy(), log_from.to_numpy()))
+
+        students = pd.read_sql("SELECT s.* FROM students s JOIN affected USING (student_id)", c)
+        logs = pd.read_sql('''
+            SELECT l.* FROM logs l JOIN affected a USING (student_id) WHERE l.date >= a.log_from
+            UNION ALL
+            SELECT l.* FROM affected a JOIN logs l ON l.student_id = a.student_id AND l.date = (
+                SELECT MAX(date) FROM logs WHERE student_id = a.student_id AND date < a.log_from)
+        ''', c)
+        scores = pd.read_sql(f'''
+            SELECT student_id, date, subject, score, since FROM (
+                SELECT s.*, a.since, ROW_NUMBER() OVER (PARTITION BY s.student_id ORDER BY s.date DESC) AS n
+                FROM scores s JOIN affected a USING (student_id) WHERE s.date <= a.since
+            ) WHERE n <= {max(SCORE_LAGS)}
+            UNION ALL
+            SELECT s.*, a.since FROM scores s JOIN affected a USING (student_id) WHERE s.date > a.since
+        ''', c)
+        if scores.empty or logs.empty:
+            return 0
+
+        features = compute_features(students, logs, scores)
+        features['exam_date'] = _day(features['exam_date'])
+        since_by_student = scores.drop_duplicates('student_id').set_index('student_id')['since']
+        features = features[features['exam_date'] > features['student_id'].map(since_by_student)]
+        features = self._stored_ewm(features, logs)
+        with c:
+            c.executemany(
+                f"INSERT OR REPLACE INTO features ({', '.join(FEATURE_COLUMNS)}) "
+                f"VALUES ({', '.join(['?'] * len(FEATURE_COLUMNS))})",
+                features[FEATURE_COLUMNS].astype(object).itertuples(index=False, name=None)
+            )
+        return len(features)
+
+    @staticmethod
+    def _stored_ewm(features, logs):
+        """EWM features from the stored state of the latest log before each exam (logs here are truncated)."""
+        state = logs[['student_id', 'date'] + EWM_COLUMNS].assign(
+            date=pd.to_datetime(logs['date']).astype("datetime64[ns]"))
+        lookup = features[['student_id']].assign(date=pd.to_datetime(features['exam_date']).astype("datetime64[ns]"),
+                                                 row=np.arange(len(features)))
+        as_of = pd.merge_asof(lookup.sort_values('date'), state.sort_values('date'), on='date',
+                              by='student_id', allow_exact_matches=False).sort_values('row')
+        return features.assign(
+            ewm_study=(as_of['ewm_study_num'] / as_of['ewm_den']).to_numpy(),
+            ewm_attendance=(as_of['ewm_attendance_num'] / as_of['ewm_den']).to_numpy(),
+        )
+
+    def features(self):
+        """Return the full feature table, ordered by exam date."""
+        return pd.read_sql("SELECT * FROM features ORDER BY exam_date, student_id, subject", self.conn)
@@ -1,117 +1,467 @@
 import pandas as pd
 import numpy as np
-import xgboost as xgb
-import shap
 import pickle
 import os
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, accuracy_score
+import hashlib
+import json
+import math
+import shutil
+import threading
+import time
+from datetime import datetime
+from collections import OrderedDict
+import storage
+from schema import apply_schema
+# xgboost, shap and sklearn are imported where they are first needed, so
+# importing this module (app start, DB-only scripts) stays cheap.
+
+# Versioned model artifacts: models/<version>/{regressor.ubj, classifier.ubj, metadata.json}
+# (no classifier.ubj for risk_mode "derived")
+# with models/LATEST naming the active version. models.pkl is the legacy format.
+ARTIFACT_DIR = "models"
+LEGACY_PICKLE = "models.pkl"
+ARTIFACT_FORMAT = 1
+RISK_BINS = [-1, 9, 14, 21]
+RISK_LABELS = [2, 1, 0]
+# Risk modes: "classifier" trains a separate XGBClassifier for the risk
+# level; "derived" trains only the regressor and bins its predicted G3 at
+# the midpoints between the RISK_BINS edges (G3 is a whole number).
+RISK_MODE_CLASSIFIER = "classifier"
+RISK_MODE_DERIVED = "derived"
+DERIVED_RISK_THRESHOLDS = [9.5, 14.5]
+# Features selected from student-mat.csv
+FEATURE_NAMES = ["G1", "G2", "studytime", "failures", "absences", "health", "freetime", "goout"]
+# How often (seconds) an engine checks LATEST for a version activated elsewhere
+RELOAD_CHECK_SECONDS = 5.0
+
+def _booster_predict(model, X):
+    """inplace_predict on the model's booster, honouring early stopping like model.predict."""
+    try:
+        iteration_range = (0, model.best_iteration + 1)
+    except AttributeError:
+        iteration_range = (0, 0)
+    return model.get_booster().inplace_predict(X, iteration_range=iteration_range)
+
+def _predict_class(model, X):
+    """Class label of a single row from the classifier's probabilities."""
+    proba = _booster_predict(model, X)
+    if proba.ndim == 1:  # binary: probability of class 1
+        return int(proba[0] > 0.5)
+    return int(np.argmax(proba[0]))
+
+def derive_risk(scores):
+    """Risk level (2=High, 1=Medium, 0=Low) from predicted G3 scores."""
+    return np.select([scores < DERIVED_RISK_THRESHOLDS[0], scores < DERIVED_RISK_THRESHOLDS[1]],
+                     [2, 1], 0).astype(np.int8)
+
+def _copy_result(result):
+    """Copy a cached predict_realtime result so callers can't mutate the cache."""
+    return {**result, "explanation": [dict(item) for item in result["explanation"]]}
+
+def _fingerprint(regressor, classifier):
+    digest = hashlib.sha1()
+    for model in (regressor, classifier):
+        if model is not None:
+            digest.update(model.get_booster().save_raw())
+    return digest.hexdigest()
+
+class ModelBundle:
+    """
+    One model version: the boosters (classifier is None in risk_mode
+    "derived"), their feature names, metadata and (lazily) the SHAP
+    explainer. Never modified after creation, so a reader holding a bundle
+    always sees a consistent set; ModelEngine swaps whole bundles by
+    reassigning a single reference.
+    """
+
+    def __init__(self, regressor, classifier, feature_names, metadata=None, explainer=None, fingerprint=None):
+        self.regressor = regressor
+        self.classifier = classifier
+        self.feature_names = list(feature_names)
+        self.metadata = metadata
+        self.fingerprint = fingerprint or _fingerprint(regressor, classifier)
+        self._explainer = explainer
+        self._explainer_lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self.metadata["version"] if self.metadata else None
+
+    @property
+    def risk_mode(self):
+        return RISK_MODE_CLASSIFIER if self.classifier is not None else RISK_MODE_DERIVED
+
+    def predict_risk(self, X, scores):
+        """Risk levels for rows X whose predicted scores are already known."""
+        if self.classifier is None:
+            return derive_risk(scores)
+        return self.classifier.predict(X)
+
+    @property
+    def explainer(self):
+        """TreeExplainer for the regressor, built on first use."""
+        if self._explainer is None:
+            with self._explainer_lock:
+                if self._explainer is None:
+                    import shap
+                    self._explainer = shap.TreeExplainer(self.regressor)
+        return self._explainer
 
 class ModelEngine:
-    def __init__(self):
-        self.regressor = None
-        self.classifier = None
-        self.explainer = None
-        # Features selected from student-mat.csv
-        self.feature_names = [
-            "G1", "G2", "studytime", "failures", "absences", 
-            "health", "freetime", "goout"
-        ]
+    def __init__(self, cache_size=4096, artifact_dir=ARTIFACT_DIR, reload_interval=RELOAD_CHECK_SECONDS,
+                 risk_mode=RISK_MODE_CLASSIFIER):
+        # Active ModelBundle; replaced as a whole, never modified in place
+        self.bundle = None
+        # Risk mode used by train(); predictions follow the active bundle's mode
+        self.risk_mode = risk_mode
+        self.artifact_dir = artifact_dir
+        self.reload_interval = reload_interval
+        self._next_reload_check = 0.0
+        self._load_lock = threading.Lock()
+        # LRU cache of predict_realtime results keyed by (model fingerprint, inputs)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._cache_stats = {"hits": 0, "misses": 0}
+        self._local = threading.local()
+
+    # Read-only views of the active bundle
+    @property
+    def regressor(self):
+        return self.bundle.regressor if self.bundle else None
+
+    @property
+    def classifier(self):
+        return self.bundle.classifier if self.bundle else None
+
+    @property
+    def explainer(self):
+        return self.bundle.explainer if self.bundle else None
+
+    @property
+    def metadata(self):
+        return self.bundle.metadata if self.bundle else None
+
+    @property
+    def fingerprint(self):
+        return self.bundle.fingerprint if self.bundle else None
+
+    @property
+    def feature_names(self):
+        return self.bundle.feature_names if self.bundle else list(FEATURE_NAMES)
+
+    def _swap(self, bundle):
+        """Make bundle the active one; in-flight calls finish on the bundle they hold."""
+        self.bundle = bundle
+        with self._cache_lock:
+            self._cache.clear()
         
-    def train(self, data_path="student-mat.csv", df=None):
+    def train(self, data_path="student-mat.csv", df=None, activate=True, params=None, extra_metrics=None,
+              risk_mode=None):
+        """
+        Train the models and save them as a new artifact version.
+        risk_mode: "classifier" or "derived" (regressor only); defaults to self.risk_mode.
+        params: XGBoost hyperparameters for both boosters (e.g. the best trial
+            of training_pipeline.search); defaults to n_estimators=100.
+        extra_metrics: merged into the saved metrics (e.g. cross-validation scores).
+        With activate=False the version is written but neither LATEST nor this
+        engine's active models change (see activate()). Returns the version name.
+        """
+        import xgboost as xgb
+        from sklearn.metrics import mean_squared_error, accuracy_score
+
+        risk_mode = risk_mode or self.risk_mode
+        if risk_mode not in (RISK_MODE_CLASSIFIER, RISK_MODE_DERIVED):
+            raise ValueError(f"Unknown risk mode {risk_mode!r}")
+        feature_names = list(FEATURE_NAMES)
         print("Loading data...")
         if df is None:
-            # Load semicolon separated file
-            df = pd.read_csv(data_path, sep=';')
+            # Only the model columns are read (Parquet copy if converted)
+            df = storage.load(data_path, columns=feature_names + ['G3'])
         
-        # Select features and target
-        X = df[self.feature_names]
+        # Select features and target (validates ranges, compact dtypes)
+        df = apply_schema(df[feature_names + ['G3']])
+        X = df[feature_names]
         y_score = df['G3']
         
         # Risk class: 0=Low (>15), 1=Medium (10-15), 2=High (<10)
         # G3 is 0-20 scale
-        y_risk = pd.cut(df['G3'], bins=[-1, 9, 14, 21], labels=[2, 1, 0]).astype(int)
+        y_risk = pd.cut(df['G3'], bins=RISK_BINS, labels=RISK_LABELS).astype(int)
         
         # Train Regressor
         print("Training Regressor...")
-        self.regressor = xgb.XGBRegressor(objective='reg:squarederror', n_estimators=100)
-        self.regressor.fit(X, y_score)
-        
-        # Train Classifier
-        print("Training Classifier...")
-        self.classifier = xgb.XGBClassifier(eval_metric='mlogloss')
-        self.classifier.fit(X, y_risk)
+        params = {"n_estimators": 100, **(params or {})}
+        regressor = xgb.XGBRegressor(objective='reg:squarederror', **params)
+        regressor.fit(X, y_score)
         
-        # Setup SHAP
-        print("Setting up SHAP...")
-        self.explainer = shap.TreeExplainer(self.regressor)
+        # Train Classifier (not needed when risk is derived from the score)
+        classifier = None
+        if risk_mode == RISK_MODE_CLASSIFIER:
+            print("Training Classifier...")
+            classifier = xgb.XGBClassifier(eval_metric='mlogloss', **params)
+            classifier.fit(X, y_risk)
+        bundle = ModelBundle(regressor, classifier, feature_names)
         
-        self.save_models()
+        scores = regressor.predict(X)
+        metrics = {
+            "n_rows": len(df),
+            "train_rmse": float(np.sqrt(mean_squared_error(y_score, scores))),
+            "train_accuracy": float(accuracy_score(y_risk, bundle.predict_risk(X, scores))),
+            **(extra_metrics or {}),
+        }
+        data_hash = hashlib.sha256(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+        # SHAP explainer is built lazily on first explanation
+        version = self.save_models(bundle, metrics=metrics, data_hash=data_hash, activate=activate, params=params)
         print("Training complete.")
+        return version
         
-    def save_models(self):
-        with open("models.pkl", "wb") as f:
-            pickle.dump({
-                "regressor": self.regressor,
-                "classifier": self.classifier,
-                "explainer": self.explainer
-            }, f)
+    def save_models(self, bundle=None, metrics=None, data_hash=None, keep=5, activate=True, params=None):
+        """
+        Write a new artifact version (native XGBoost UBJ + metadata.json) of
+        bundle (default: the active one), then, if activate, point LATEST at
+        it and make it this engine's active bundle. Prunes all but the `keep`
+        newest versions, never removing the active one. Returns the version name.
+
+        The version directory is written under a temporary name and renamed
+        into place, and LATEST is replaced atomically, so other processes
+        never see a partial artifact.
+        """
+        import xgboost as xgb
+        bundle = bundle or self.bundle
+        version = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{bundle.fingerprint[:8]}"
+        os.makedirs(self.artifact_dir, exist_ok=True)
+        path = os.path.join(self.artifact_dir, version)
+        tmp_path = os.path.join(self.artifact_dir, f".tmp-{version}")
+        os.makedirs(tmp_path)
+        try:
+            bundle.regressor.save_model(os.path.join(tmp_path, "regressor.ubj"))
+            if bundle.classifier is not None:
+                bundle.classifier.save_model(os.path.join(tmp_path, "classifier.ubj"))
+            metadata = {
+                "format": ARTIFACT_FORMAT,
+                "version": version,
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "xgboost_version": xgb.__version__,
+                "feature_names": bundle.feature_names,
+                "risk_mode": bundle.risk_mode,
+                "risk_bins": RISK_BINS,
+                "risk_labels": RISK_LABELS,
+                "fingerprint": bundle.fingerprint,
+                "data_hash": data_hash,
+                "params": params or {},
+                "metrics": metrics or {},
+            }
+            with open(os.path.join(tmp_path, "metadata.json"), "w") as f:
+                json.dump(metadata, f, indent=2)
+            os.replace(tmp_path, path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        if activate:
+            self._write_latest(version)
+            self._swap(ModelBundle(bundle.regressor, bundle.classifier, bundle.feature_names,
+                                   metadata, bundle._explainer, bundle.fingerprint))
+
+        active = self.current_version()
+        versions = sorted(d for d in os.listdir(self.artifact_dir)
+                          if not d.startswith(".") and os.path.isdir(os.path.join(self.artifact_dir, d)))
+        for old in versions[:-keep]:
+            if old != active:
+                shutil.rmtree(os.path.join(self.artifact_dir, old), ignore_errors=True)
+        return version
+
+    def _write_latest(self, version):
+        """Point LATEST at version (temp file + rename, so readers never see it half-written)."""
+        latest = os.path.join(self.artifact_dir, "LATEST")
+        tmp = f"{latest}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(version)
+        os.replace(tmp, latest)
+
+    def activate(self, version):
+        """Make a saved version the active one (LATEST) and load it."""
+        if not os.path.isdir(os.path.join(self.artifact_dir, version)):
+            raise Exception(f"Unknown model version {version}")
+        self._write_latest(version)
+        return self.load_models()
+
+    def current_version(self):
+        """Version named by LATEST, or None if no artifact has been saved."""
+        try:
+            with open(os.path.join(self.artifact_dir, "LATEST")) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def read_metadata(self, version):
+        """metadata.json of a saved version."""
+        with open(os.path.join(self.artifact_dir, version, "metadata.json")) as f:
+            return json.load(f)
+
+    def _load_bundle(self, version):
+        metadata = self.read_metadata(version)
+        if metadata["format"] != ARTIFACT_FORMAT:
+            raise Exception(f"Unsupported model artifact format {metadata['format']}")
+        import xgboost as xgb
+        path = os.path.join(self.artifact_dir, version)
+        regressor = xgb.XGBRegressor()
+        regressor.load_model(os.path.join(path, "regressor.ubj"))
+        classifier = None
+        if metadata.get("risk_mode", RISK_MODE_CLASSIFIER) == RISK_MODE_CLASSIFIER:
+            classifier = xgb.XGBClassifier()
+            classifier.load_model(os.path.join(path, "classifier.ubj"))
+        return ModelBundle(regressor, classifier, metadata["feature_names"], metadata)
             
     def load_models(self):
-        if os.path.exists("models.pkl"):
-            with open("models.pkl", "rb") as f:
-                models = pickle.load(f)
-                self.regressor = models["regressor"]
-                self.classifier = models["classifier"]
-                self.explainer = models["explainer"]
-            return True
-        return False
-
-    def predict_batch(self, df):
+        with self._load_lock:
+            version = self.current_version()
+            if version:
+                self._swap(self._load_bundle(version))
+                return True
+            if os.path.exists(LEGACY_PICKLE):
+                with open(LEGACY_PICKLE, "rb") as f:
+                    models = pickle.load(f)
+                self._swap(ModelBundle(models["regressor"], models["classifier"], FEATURE_NAMES,
+                                       explainer=models["explainer"]))
+                return True
+            return False
+
+    def refresh(self, force=False):
         """
-        Predicts for a whole dataframe.
-        Returns dataframe with 'Predicted Score', 'Risk Level', 'Risk Val'
+        Load the version named by LATEST if it differs from the active one,
+        e.g. after another process trained or activated a model. Checks at
+        most once per reload_interval seconds unless force. Returns True if
+        a new bundle was swapped in.
         """
-        if not self.regressor:
+        now = time.monotonic()
+        if not force and now < self._next_reload_check:
+            return False
+        self._next_reload_check = now + self.reload_interval
+        version = self.current_version()
+        if version is None or (self.bundle is not None and version == self.bundle.version):
+            return False
+        return self.load_models()
+
+    def _active_bundle(self):
+        """The bundle to use for one call: picks up new versions, loads on first use."""
+        self.refresh()
+        bundle = self.bundle
+        if bundle is None:
             if not self.load_models():
                 raise Exception("Models not trained or loaded")
+            bundle = self.bundle
+        return bundle
+
+    def _cache_key(self, bundle, inputs):
+        """Integer feature tuple, or None if any input is missing or not a whole number."""
+        values = tuple(inputs[f] for f in bundle.feature_names)
+        # NaN (missing) and inf have no integer form: predict them uncached
+        if any(not math.isfinite(v) or float(v) != int(v) for v in values):
+            return None
+        return (bundle.fingerprint, tuple(int(v) for v in values))
+
+    def cache_info(self):
+        with self._cache_lock:
+            return {**self._cache_stats, "size": len(self._cache), "max_size": self.cache_size}
+
+    def predict_batch(self, df, explain=False, top_k=2, chunk_size=10_000):
+        """
+        Predicts for a whole dataframe.
+        Returns dataframe with 'Predicted Score', 'Risk Level', 'Risk Val'.
+        With explain=True also adds one 'SHAP <feature>' column per feature and
+        'Top Drivers' (up to top_k features pulling each score down, worst first).
+        SHAP runs on the whole matrix in chunks of chunk_size rows.
+        """
+        bundle = self._active_bundle()
         
         # Ensure columns exist
-        X = df[self.feature_names]
+        X = df[bundle.feature_names]
         
-        pred_scores = self.regressor.predict(X)
-        pred_risks = self.classifier.predict(X)
+        pred_scores = bundle.regressor.predict(X)
+        pred_risks = bundle.predict_risk(X, pred_scores)
         risk_labels = {0: "Low Risk", 1: "Medium Risk", 2: "High Risk"}
         
         results = df.copy()
-        results['Predicted Score'] = np.round(pred_scores, 1)
-        results['Risk Val'] = pred_risks
+        results['Predicted Score'] = np.round(pred_scores, 1).astype(np.float32)
+        results['Risk Val'] = pred_risks.astype(np.int8)
         results['Risk Level'] = [risk_labels[r] for r in pred_risks]
+
+        if explain:
+            shap_values = self.explain_batch(X, chunk_size=chunk_size, bundle=bundle)
+            for i, feature in enumerate(bundle.feature_names):
+                results[f'SHAP {feature}'] = shap_values[:, i]
+            results['Top Drivers'] = self.top_drivers(shap_values, top_k, feature_names=bundle.feature_names)
         
         return results
+
+    def explain_batch(self, X, chunk_size=10_000, bundle=None):
+        """SHAP values for every row of X as a float32 (rows x features) matrix."""
+        bundle = bundle or self._active_bundle()
+        out = np.empty((len(X), len(bundle.feature_names)), dtype=np.float32)
+        for start in range(0, len(X), chunk_size):
+            chunk = X.iloc[start:start + chunk_size]
+            out[start:start + len(chunk)] = bundle.explainer.shap_values(chunk)
+        return out
+
+    def top_drivers(self, shap_values, top_k=2, feature_names=None):
+        """Per row, the names of up to top_k features with the most negative SHAP value."""
+        order = np.argsort(shap_values, axis=1, kind='stable')[:, :top_k]
+        negative = np.take_along_axis(shap_values, order, axis=1) < 0
+        names = np.asarray(feature_names or self.feature_names)
+        return [list(names[idx[mask]]) for idx, mask in zip(order, negative)]
         
     def predict_realtime(self, inputs):
         """
         inputs: dict with keys matching self.feature_names
         """
-        if not self.regressor:
-            if not self.load_models():
-                raise Exception("Models not trained or loaded")
-                
-        # Prepare input
-        input_df = pd.DataFrame([inputs], columns=self.feature_names)
+        bundle = self._active_bundle()
+
+        key = self._cache_key(bundle, inputs) if self.cache_size else None
+        if key is not None:
+            with self._cache_lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    self._cache_stats["hits"] += 1
+                    return _copy_result(cached)
+                self._cache_stats["misses"] += 1
+
+        result = self._predict_one(inputs, bundle)
+
+        if key is not None:
+            with self._cache_lock:
+                self._cache[key] = result
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return _copy_result(result)
+
+    def _row_buffer(self, n_features):
+        """Per-thread preallocated float32 row for the single-row fast path."""
+        buf = getattr(self._local, "row", None)
+        if buf is None or buf.shape[1] != n_features:
+            buf = self._local.row = np.empty((1, n_features), dtype=np.float32)
+        return buf
+
+    def _predict_one(self, inputs, bundle=None):
+        bundle = bundle or self._active_bundle()
+        # Fill the row buffer instead of building a one-row DataFrame
+        row = self._row_buffer(len(bundle.feature_names))
+        row[0] = [inputs[f] for f in bundle.feature_names]
         
-        # Predict
-        pred_score = self.regressor.predict(input_df)[0]
-        pred_risk = self.classifier.predict(input_df)[0]
+        # Predict straight on the boosters
+        pred_score = _booster_predict(bundle.regressor, row)[0]
+        if bundle.classifier is None:
+            pred_risk = int(derive_risk(pred_score))
+        else:
+            pred_risk = _predict_class(bundle.classifier, row)
         risk_labels = {0: "Low Risk", 1: "Medium Risk", 2: "High Risk"}
         
         # Explain
-        shap_values = self.explainer.shap_values(input_df)
+        shap_values = bundle.explainer.shap_values(row)
         
         # Format SHAP for frontend
         explanation = []
-        for i, feature in enumerate(self.feature_names):
+        for i, feature in enumerate(bundle.feature_names):
             explanation.append({
                 "feature": feature,
                 "value": inputs[feature],
@@ -0,0 +1,265 @@
+"""
+Online feature updates from single daily log events.
+
+OnlineFeatureStore keeps per-student running state in SQLite: a ring buffer
+of the last RING_DAYS daily slots, running sums for each look-back window,
+the positional sums of the 14-day study trend, the EWM numerator and
+denominator, and the last few scores. record_log() folds one log into that
+state in O(1) (it evicts at most RING_DAYS expired slots per window) and
+features() is available immediately afterwards. The values match
+feature_engineering.compute_features for an exam on the as-of day (any day
+after the student's latest log and score).
+
+Logs must arrive in date order per student; a second log for the latest
+day replaces it. Older logs raise ValueError (recompute those students in
+batch with FeatureStore).
+
+Every update reads, modifies and writes a state inside BEGIN IMMEDIATE, so
+stores in several threads or processes on one file never lose an update.
+"""
+import json
+import sqlite3
+from contextlib import contextmanager
+
+import pandas as pd
+
+from database import PRAGMAS
+from feature_engineering import EWM_SPAN, SCORE_LAGS, WINDOWS
+from feature_store import STORE_NAME
+
+RING_DAYS = max(WINDOWS)
+TREND_WINDOW = 14
+_DECAY = 1 - 2 / (EWM_SPAN + 1)
+# Per-window running sums: log count, study, attendance, sleep, screen time,
+# and sum(ordinal * study) for the trend regression
+N, STUDY, ATTEND, SLEEP, SCREEN, ORD_STUDY = range(6)
+
+def _day_number(value):
+    """Date-like value -> whole days since the epoch."""
+    return int(pd.Timestamp(value).normalize().value // 86_400_000_000_000)
+
+def _new_state():
+    return {
+        "last_day": None,
+        "count": 0,
+        # slot = [day, ordinal, study, attendance, sleep, screen_time]
+        "ring": [None] * RING_DAYS,
+        "sums": {str(w): [0.0] * 6 for w in WINDOWS},
+        # EWM numerators (study, attendance) and denominator, before and after the last log
+        "ewm": [0.0, 0.0, 0.0],
+        "ewm_prev": [0.0, 0.0, 0.0],
+        # [day, score] of the most recent scores, oldest first
+        "scores": [],
+    }
+
+def _add(sums, slot, sign):
+    _, ordinal, study, attendance, sleep, screen = slot
+    for i, value in ((N, 1.0), (STUDY, study), (ATTEND, attendance), (SLEEP, sleep),
+                     (SCREEN, screen), (ORD_STUDY, ordinal * study)):
+        sums[i] += sign * value
+
+def _expired(state, w, old_as_of, new_as_of):
+    """
+    Ring slots that leave window w when the as-of day moves from old_as_of
+    (the day after the latest log) to new_as_of: days in [old - w, new - w)
+    that were logged, so at most w slots.
+    """
+    for day in range(old_as_of - w, min(new_as_of - w, old_as_of)):
+        slot = state["ring"][day % RING_DAYS]
+        if slot is not None and slot[0] == day:
+            yield slot
+
+def _advance(state, day):
+    """Evict what falls out of every window once `day` is the latest logged day."""
+    if state["last_day"] is None:
+        return
+    for w in WINDOWS:
+        sums = state["sums"][str(w)]
+        for slot in _expired(state, w, state["last_day"] + 1, day + 1):
+            _add(sums, slot, -1)
+
+def _apply_log(state, log):
+    """O(1) update of one student's state with a daily log."""
+    day = _day_number(log["date"])
+    values = [float(log[k]) for k in ("study_hours", "attendance", "sleep_hours", "screen_time")]
+    last = state["last_day"]
+    if last is not None and day < last:
+        raise ValueError(f"log for {log['student_id']} on day {day} is older than its latest log ({last})")
+
+    if day == last:
+        # Replace the latest day's log: take it out of the sums and the EWM
+        old = state["ring"][day % RING_DAYS]
+        for sums in state["sums"].values():
+            _add(sums, old, -1)
+        state["ewm"] = state["ewm_prev"]
+        ordinal = old[1]
+    else:
+        _advance(state, day)
+        ordinal = state["count"]
+        state["count"] += 1
+        state["last_day"] = day
+
+    slot = [day, ordinal] + values
+    state["ring"][day % RING_DAYS] = slot
+    for sums in state["sums"].values():
+        _add(sums, slot, 1)
+
+    study, attendance = values[0], values[1]
+    num_study, num_attend, den = state["ewm"]
+    state["ewm_prev"] = state["ewm"]
+    state["ewm"] = [study + _DECAY * num_study, attendance + _DECAY * num_attend, 1 + _DECAY * den]
+
+def _apply_score(state, date, score):
+    day = _day_number(date)
+    scores = [s for s in state["scores"] if s[0] != day] + [[day, float(score)]]
+    state["scores"] = sorted(scores)[-max(SCORE_LAGS):]
+
+def _latest_day(state):
+    return max([state["last_day"]] + [day for day, _ in state["scores"]])
+
+def _mean(total, n):
+    return total / n if n > 0 else 0.0
+
+def _trend(sums, count):
+    """OLS slope of study hours over x = 0..n-1 from the window's running sums."""
+    n, sum_y = sums[N], sums[STUDY]
+    if n <= 1:
+        return 0.0
+    # The window is a suffix of the log sequence: ordinals count-n .. count-1
+    sum_xy = sums[ORD_STUDY] - (count - n) * sum_y
+    sum_x = n * (n - 1) / 2
+    return (n * sum_xy - sum_x * sum_y) / (n * n * (n * n - 1) / 12)
+
+class OnlineFeatureStore:
+    """Per-student streaming feature state, persisted in the online_state table."""
+
+    def __init__(self, path=STORE_NAME):
+        self.path = path
+        # Autocommit mode: transactions are opened explicitly by _write()
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        # WAL + synchronous=NORMAL: one small commit per event without an fsync each
+        for pragma in PRAGMAS:
+            self.conn.execute(pragma)
+        with self._write():
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS online_state (
+                    student_id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL
+                )
+            ''')
+
+    def close(self):
+        self.conn.close()
+
+    @contextmanager
+    def _write(self):
+        """
+        Transaction that takes the write lock before its first read, so a
+        concurrent update of the same state waits (busy_timeout) instead of
+        being overwritten.
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def _load(self, student_id):
+        row = self.conn.execute("SELECT state FROM online_state WHERE student_id = ?",
+                                (str(student_id),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _save(self, student_id, state):
+        self.conn.execute("INSERT OR REPLACE INTO online_state (student_id, state) VALUES (?, ?)",
+                          (str(student_id), json.dumps(state)))
+
+    def record_log(self, log):
+        """
+        Fold one daily log (a mapping with student_id, date, study_hours,
+        attendance, sleep_hours, screen_time) into its student's state.
+        Returns the student's features as of the day after its latest event.
+        """
+        with self._write():
+            state = self._load(log["student_id"]) or _new_state()
+            _apply_log(state, log)
+            self._save(log["student_id"], state)
+        return self._features(state)
+
+    def record_score(self, student_id, date, score):
+        """Remember a test score for the lag features (a second score on the same day replaces it)."""
+        with self._write():
+            state = self._load(student_id) or _new_state()
+            _apply_score(state, date, score)
+            self._save(student_id, state)
+
+    def replay(self, logs, scores=None):
+        """
+        Feed batch logs (and scores) through the online update, in date order,
+        e.g. to initialize the state from history. States are loaded, updated
+        in memory and written back in one transaction.
+        """
+        states = {}
+
+        def state_of(student_id):
+            student_id = str(student_id)
+            if student_id not in states:
+                states[student_id] = self._load(student_id) or _new_state()
+            return states[student_id]
+
+        with self._write():
+            for log in logs.sort_values("date", kind="stable").to_dict("records"):
+                _apply_log(state_of(log["student_id"]), log)
+            if scores is not None:
+                for row in scores.itertuples(index=False):
+                    _apply_score(state_of(row.student_id), row.date, row.score)
+            for student_id, state in states.items():
+                self._save(student_id, state)
+        return len(states)
+
+    def features(self, student_id, as_of=None):
+        """
+        Features of a student for an exam on as_of (default: the day after
+        the latest log or score), from the logs and scores before it. Only
+        the last few scores are kept, so as_of must be after all recorded
+        events. None if the student has no logs yet.
+        """
+        state = self._load(student_id)
+        if state is None or state["last_day"] is None:
+            return None
+        as_of_day = _latest_day(state) + 1 if as_of is None else _day_number(as_of)
+        if as_of_day <= _latest_day(state):
+            raise ValueError("as_of must be after the student's latest log and score")
+        return self._features(state, as_of_day)
+
+    def _features(self, state, as_of_day=None):
+        as_of_day = _latest_day(state) + 1 if as_of_day is None else as_of_day
+        windows = {}
+        for w in WINDOWS:
+            sums = list(state["sums"][str(w)])
+            # A later as-of day shrinks the windows; nothing is persisted
+            for slot in _expired(state, w, state["last_day"] + 1, as_of_day):
+                _add(sums, slot, -1)
+            windows[w] = sums
+
+        num_study, num_attend, den = state["ewm"]
+        previous = [score for day, score in reversed(state["scores"]) if day < as_of_day]
+        features = {
+            "as_of": pd.Timestamp(as_of_day, unit="D"),
+            "avg_study_7d": _mean(windows[7][STUDY], windows[7][N]),
+            "avg_study_30d": _mean(windows[30][STUDY], windows[30][N]),
+            "attendance_rate_30d": _mean(windows[30][ATTEND], windows[30][N]),
+            "study_trend_14d": _trend(windows[TREND_WINDOW], state["count"]),
+            "ewm_study": num_study / den,
+            "ewm_attendance": num_attend / den,
+            "avg_sleep_7d": _mean(windows[7][SLEEP], windows[7][N]),
+            "avg_sleep_30d": _mean(windows[30][SLEEP], windows[30][N]),
+            "avg_screen_time_7d": _mean(windows[7][SCREEN], windows[7][N]),
+            "avg_screen_time_30d": _mean(windows[30][SCREEN], windows[30][N]),
+        }
+        features["study_attendance_interaction"] = features["avg_study_30d"] * features["attendance_rate_30d"]
+        for lag in SCORE_LAGS:
+            name = "prev_score" if lag == 1 else f"score_lag_{lag}"
+            features[name] = previous[lag - 1] if len(previous) >= lag else float("nan")
+        return features
@@ -1,49 +1,80 @@
+import numpy as np
 from translations import TRANSLATIONS
 
+# Recommendation keys in translations.py; batch results refer to them by index
+REC_KEYS = (
+    "rec_attendance", "rec_study", "rec_failures", "rec_social", "rec_health", "rec_scores",
+    "rec_intervention", "rec_monitor", "rec_help", "rec_excellent", "rec_maintain"
+)
+_CODE = {key: i for i, key in enumerate(REC_KEYS)}
+
+# feature: (recommendation key, condition on the feature value)
+FEATURE_RULES = {
+    "absences": ("rec_attendance", lambda v: np.ones(v.shape, dtype=bool)),
+    "studytime": ("rec_study", lambda v: v < 3),
+    "failures": ("rec_failures", lambda v: v > 0),
+    "goout": ("rec_social", lambda v: v > 4),
+    "health": ("rec_health", lambda v: v < 3),
+    "G1": ("rec_scores", lambda v: np.ones(v.shape, dtype=bool)),
+    "G2": ("rec_scores", lambda v: np.ones(v.shape, dtype=bool)),
+}
+
+HIGH_RISK_KEYS = {"teacher": "rec_intervention", "parent": "rec_monitor"}
+
+def get_recommendation_codes(shap_values, feature_values, risk_levels, feature_names,
+                             role="student", top=2, max_recs=3):
+    """
+    Vectorized recommendations for a whole class.
+
+    shap_values, feature_values: (students x features) arrays
+    risk_levels: (students,) array of 0/1/2
+    Returns an int8 (students x max_recs) array of indices into REC_KEYS,
+    padded with -1. Use render_recommendations() to get translated text.
+    """
+    shap_values = np.asarray(shap_values, dtype=np.float64)
+    feature_values = np.asarray(feature_values, dtype=np.float64)
+    risk_levels = np.asarray(risk_levels)
+    n = len(shap_values)
+
+    # 1. Top negative factors (ascending impact, ties keep feature order)
+    order = np.argsort(shap_values, axis=1, kind="stable")[:, :top]
+    impact = np.take_along_axis(shap_values, order, axis=1)
+    value = np.take_along_axis(feature_values, order, axis=1)
+    slots = np.full((n, order.shape[1]), -1, dtype=np.int8)
+    for feature, (key, condition) in FEATURE_RULES.items():
+        if feature in feature_names:
+            hit = (order == feature_names.index(feature)) & (impact < 0) & condition(value)
+            slots[hit] = _CODE[key]
+
+    # 2. Risk-based generic advice
+    risk = np.full((n, 1), -1, dtype=np.int8)
+    risk[risk_levels == 2] = _CODE[HIGH_RISK_KEYS.get(role, "rec_help")]
+    risk[risk_levels == 0] = _CODE["rec_excellent"]
+
+    # Ensure at least one rec
+    candidates = np.hstack([slots, risk, np.full((n, 1), -1, dtype=np.int8)])
+    candidates[(candidates == -1).all(axis=1), -1] = _CODE["rec_maintain"]
+
+    # Move the -1 gaps to the end of each row, keeping the order of the rest
+    packed = np.take_along_axis(candidates, np.argsort(candidates == -1, axis=1, kind="stable"), axis=1)
+    return packed[:, :max_recs]
+
+def render_recommendations(codes, lang="en"):
+    """Translate one row of recommendation codes into text."""
+    t = TRANSLATIONS.get(lang, TRANSLATIONS["en"])
+    return [t[REC_KEYS[c]] for c in codes if c >= 0]
+
 def get_recommendations(prediction_result, role="student", lang="en"):
     """
     Generates concise recommendations based on SHAP explanation and risk level.
     Features: G1, G2, studytime, failures, absences, health, freetime, goout
     """
-    recs = []
     explanation = prediction_result['explanation']
-    risk_level = prediction_result['risk_level']
-    t = TRANSLATIONS.get(lang, TRANSLATIONS["en"])
-    
-    # Sort features by negative impact
-    negative_impacts = sorted([x for x in explanation if x['impact'] < 0], key=lambda x: x['impact'])
-    
-    # 1. Address top negative factors
-    for item in negative_impacts[:2]: # Top 2 issues
-        feature = item['feature']
-        val = item['value']
-        
-        if feature == "absences":
-            recs.append(t["rec_attendance"])
-        elif feature == "studytime" and val < 3:
-            recs.append(t["rec_study"])
-        elif feature == "failures" and val > 0:
-            recs.append(t["rec_failures"])
-        elif feature == "goout" and val > 4:
-            recs.append(t["rec_social"])
-        elif feature == "health" and val < 3:
-            recs.append(t["rec_health"])
-        elif feature == "G1" or feature == "G2":
-            recs.append(t["rec_scores"])
-            
-    # 2. Risk-based generic advice
-    if risk_level == 2: # High
-        if role == "teacher":
-            recs.append(t["rec_intervention"])
-        elif role == "parent":
-            recs.append(t["rec_monitor"])
-        else: # Student
-            recs.append(t["rec_help"])
-    elif risk_level == 0: # Low
-        recs.append(t["rec_excellent"])
-        
-    # Ensure at least one rec
-    if not recs:
-        recs.append(t["rec_maintain"])
-        
-    return recs[:3] # Max 3 concise bullets
+    codes = get_recommendation_codes(
+        [[x['impact'] for x in explanation]],
+        [[x['value'] for x in explanation]],
+        [prediction_result['risk_level']],
+        [x['feature'] for x in explanation],
+        role=role
+    )
+    return render_recommendations(codes[0], lang) # Max 3 concise bullets
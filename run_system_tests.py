@@ -1,10 +1,31 @@
 import unittest
+from unittest import mock
 import pandas as pd
 import os
 import sqlite3
 from model_engine import ModelEngine
 import database as db
 import shutil
+import tempfile
+import io
+import threading
+import numpy as np
+import data_generator
+import feature_engineering
+from feature_store import FeatureStore
+import online_features
+from online_features import OnlineFeatureStore
+import storage
+import csv_ingest
+import training_jobs
+import training_pipeline
+import schema
+from recommendations import get_recommendations, get_recommendation_codes, render_recommendations
+
+class _CrashOnUnpickle:
+    """Training input that kills the worker process when it is unpickled there."""
+    def __reduce__(self):
+        return (os._exit, (1,))
 
 class TestStudentPerformanceSystem(unittest.TestCase):
     
@@ -27,9 +48,11 @@ class TestStudentPerformanceSystem(unittest.TestCase):
     @classmethod
     def tearDownClass(cls):
         # On Windows, sometimes the database file is locked, so we use a try-except
+        db.close_pool()
         try:
-            if os.path.exists(cls.test_db):
-                os.remove(cls.test_db)
+            for path in (cls.test_db, cls.test_db + "-wal", cls.test_db + "-shm"):
+                if os.path.exists(path):
+                    os.remove(path)
         except PermissionError:
             pass  # Ignore permission errors on Windows
         print("\nSystem Verification Complete.")
@@ -40,7 +63,9 @@ class TestStudentPerformanceSystem(unittest.TestCase):
         try:
             df = pd.read_csv("student-mat.csv", sep=';')
             self.engine.train(df=df)
-            self.assertTrue(os.path.exists("models.pkl"), "Model file not created")
+            version = self.engine.current_version()
+            self.assertIsNotNone(version, "Model artifact not created")
+            self.assertTrue(os.path.exists(os.path.join("models", version, "regressor.ubj")))
             print("   -> Model trained successfully.")
         except Exception as e:
             self.fail(f"Model training failed: {e}")
@@ -101,5 +126,772 @@ class TestStudentPerformanceSystem(unittest.TestCase):
         self.assertEqual(len(final_df), 6)
         print(f"   -> Batch processed and saved. Total students: {len(final_df)}")
 
+    def test_05_vectorized_features_match_loop(self):
+        """Test the vectorized feature engine against the reference loop"""
+        print("\n[Test] Vectorized Feature Engine...")
+        students = data_generator.generate_students(15)
+        logs = data_generator.generate_daily_logs(students, days=35)
+        # Drop some days so windows have gaps
+        logs = logs.sample(frac=0.8, random_state=0).sort_values(['student_id', 'date'])
+        scores = data_generator.generate_scores(students, logs)
+
+        fast = feature_engineering.compute_features(students, logs.copy(), scores.copy())
+        slow = feature_engineering.compute_features_loop(students, logs.copy(), scores.copy())
+
+        self.assertEqual(list(fast.columns), list(slow.columns))
+        self.assertEqual(len(fast), len(slow))
+        self.assertTrue((fast['student_id'].values == slow['student_id'].values).all())
+        for col in feature_engineering.FEATURE_COLUMNS[4:]:
+            self.assertTrue(np.allclose(fast[col], slow[col].astype(float), equal_nan=True), col)
+        self.assertTrue(fast['prev_score'].notna().any())
+        print(f"   -> {len(fast)} feature rows match.")
+
+    def test_06_incremental_feature_store(self):
+        """Test that incremental updates match a full recompute"""
+        print("\n[Test] Incremental Feature Store...")
+        students = data_generator.generate_students(10)
+        logs = data_generator.generate_daily_logs(students, days=35)
+        scores = data_generator.generate_scores(students, logs)
+        cutoff = sorted(logs['date'].unique())[20]
+
+        path = "test_feature_store.db"
+        if os.path.exists(path):
+            os.remove(path)
+        store = FeatureStore(path)
+        try:
+            store.update(students, logs[logs['date'] <= cutoff], scores[scores['date'] <= cutoff])
+            stats = store.update(students, logs, scores)
+            self.assertEqual(stats['new_logs'], (logs['date'] > cutoff).sum())
+            self.assertEqual(store.update(students, logs, scores)['features_recomputed'], 0)
+
+            stored = store.features()
+            full = feature_engineering.compute_features(students, logs, scores)
+            full = full.sort_values(['exam_date', 'student_id']).reset_index(drop=True)
+            self.assertEqual(len(stored), len(full))
+            self.assertTrue(np.allclose(stored['avg_study_30d'], full['avg_study_30d']))
+            self.assertTrue(np.allclose(stored['study_trend_14d'], full['study_trend_14d']))
+            for col in ['ewm_study', 'avg_sleep_7d', 'prev_score', 'score_lag_3']:
+                self.assertTrue(np.allclose(stored[col].astype(float), full[col], equal_nan=True), col)
+            store.close()
+
+            # A store from before the lag/EWM columns gets them added and filled
+            conn = sqlite3.connect(path)
+            conn.execute("ALTER TABLE features DROP COLUMN ewm_study")
+            conn.execute("ALTER TABLE logs DROP COLUMN ewm_den")
+            conn.execute("UPDATE features SET prev_score = 0")
+            conn.commit()
+            conn.close()
+            store = FeatureStore(path)
+            migrated = store.features()
+            self.assertTrue(np.allclose(migrated['ewm_study'], full['ewm_study']))
+            self.assertTrue(np.allclose(migrated['prev_score'].astype(float), full['prev_score'], equal_nan=True))
+
+            # Two tests on one day in different subjects are both kept
+            last_exam = scores['date'].max()
+            second = scores[scores['date'] == last_exam].head(2).assign(subject="History", score=33.0)
+            both = pd.concat([scores.astype({"subject": object}), second.astype({"subject": object})],
+                             ignore_index=True)
+            stats = store.update(students, logs, both)
+            self.assertEqual(stats['new_scores'], 2)
+            stored = store.features()
+            full = feature_engineering.compute_features(students, logs, both)
+            self.assertEqual(len(stored), len(full))
+            self.assertEqual((stored['subject'] == "History").sum(), 2)
+            store.close()
+
+            # Stores keyed on (student_id, date) only are rebuilt with the subject in the key
+            conn = sqlite3.connect(path)
+            conn.executescript('''
+                CREATE TABLE scores_v1 (student_id TEXT, date TEXT, subject TEXT, score REAL,
+                                        PRIMARY KEY (student_id, date));
+                INSERT OR IGNORE INTO scores_v1 SELECT * FROM scores;
+                DROP TABLE scores;
+                ALTER TABLE scores_v1 RENAME TO scores;
+            ''')
+            conn.close()
+            store = FeatureStore(path)
+            self.assertEqual(store.update(students, logs, both)['new_scores'], 2)
+            self.assertEqual(len(store.features()), len(full))
+        finally:
+            store.close()
+            os.remove(path)
+        print(f"   -> Incremental store matches full recompute ({len(stored)} rows).")
+
+    def test_07_parquet_storage(self):
+        """Test CSV -> Parquet conversion and projected loads"""
+        print("\n[Test] Parquet Storage...")
+        columns = self.engine.feature_names + ['G3']
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = os.path.join(tmp, "student-mat.csv")
+            shutil.copy("student-mat.csv", csv_path)
+            from_csv = storage.load(csv_path, columns=columns)
+            self.assertFalse(storage.has_fresh_parquet(csv_path))
+
+            storage.convert(csv_path)
+            self.assertTrue(storage.has_fresh_parquet(csv_path))
+            from_parquet = storage.load(csv_path, columns=columns)
+
+            self.assertEqual(list(from_parquet.columns), columns)
+            pd.testing.assert_frame_equal(from_parquet, from_csv[columns])
+
+            # Gaps first seen after the first chunk keep the declared column types
+            gappy = pd.read_csv("student-mat.csv", sep=';')
+            gappy.loc[:99, 'Mjob'] = np.nan
+            gappy.loc[250, 'G1'] = np.nan
+            gappy.to_csv(csv_path, sep=';', index=False)
+            storage.convert(csv_path, chunksize=100)
+            reloaded = storage.load(csv_path)
+            self.assertEqual(len(reloaded), len(gappy))
+            self.assertTrue(pd.isna(reloaded.loc[250, 'G1']))
+            self.assertTrue(np.allclose(reloaded['G1'].astype(float), gappy['G1'], equal_nan=True))
+            self.assertEqual(reloaded['Mjob'].isna().sum(), 100)
+            self.assertEqual(reloaded.loc[100:, 'Mjob'].astype(str).tolist(), gappy.loc[100:, 'Mjob'].tolist())
+        print(f"   -> Parquet load matches CSV ({len(from_parquet)} rows).")
+
+    def test_08_compact_schema(self):
+        """Test dtype downcasting and range validation"""
+        print("\n[Test] Compact Schema...")
+        df = pd.read_csv("student-mat.csv", sep=';')
+        compact = schema.apply_schema(df)
+        self.assertEqual(compact['G3'].dtype, 'uint8')
+        self.assertEqual(compact['school'].dtype, 'category')
+        self.assertLess(compact.memory_usage(deep=True).sum(), df.memory_usage(deep=True).sum() / 4)
+
+        with self.assertRaises(schema.SchemaError):
+            schema.apply_schema(pd.DataFrame({"G1": [12, 25]}))
+        with self.assertRaises(schema.SchemaError):
+            schema.apply_schema(pd.DataFrame({"studytime": [2.5]}))
+
+        # Reads do not validate, but must not wrap out-of-range values around
+        read = schema.apply_schema(pd.DataFrame({"absences": [300, 4], "G3": [-1, 12]}), validate=False)
+        self.assertTrue(read['absences'].isna().iloc[0])
+        self.assertTrue(read['G3'].isna().iloc[0])
+        self.assertEqual(read['G3'].iloc[1], 12)
+
+        # Rows written behind the app's back read back as missing, not 44 / 255
+        conn = sqlite3.connect(db.DB_NAME)
+        with conn:
+            conn.execute("INSERT INTO students (name, absences, G3) VALUES ('Bad Row', 300, -1)")
+        conn.close()
+        bad = db.get_all_students().set_index('name').loc['Bad Row']
+        self.assertTrue(pd.isna(bad['absences']) and pd.isna(bad['G3']))
+        conn = sqlite3.connect(db.DB_NAME)
+        with conn:
+            conn.execute("DELETE FROM students WHERE name = 'Bad Row'")
+        conn.close()
+
+        with self.assertRaises(schema.SchemaError):
+            db.add_student({"name": "Too Many Absences", "absences": 300})
+        print("   -> Compact dtypes applied and ranges validated.")
+
+    def test_09_prediction_cache(self):
+        """Test the predict_realtime LRU cache"""
+        print("\n[Test] Prediction Cache...")
+        engine = ModelEngine(cache_size=2)
+        inputs = {
+            "G1": 11, "G2": 12, "studytime": 2, "failures": 1,
+            "absences": 6, "health": 3, "freetime": 4, "goout": 4
+        }
+        first = engine.predict_realtime(inputs)
+        first['explanation'][0]['impact'] = 999  # must not leak into the cache
+        second = engine.predict_realtime(inputs)
+        self.assertEqual(engine.cache_info()['hits'], 1)
+        self.assertNotEqual(second['explanation'][0]['impact'], 999)
+        self.assertEqual(second['predicted_score'], first['predicted_score'])
+
+        # Fractional inputs bypass the cache; the LRU stays bounded
+        engine.predict_realtime({**inputs, "G1": 11.5})
+        for g1 in range(5):
+            engine.predict_realtime({**inputs, "G1": g1})
+        self.assertEqual(engine.cache_info()['size'], 2)
+
+        # Missing inputs (e.g. NULLs read from the database) are predicted uncached
+        missing = engine.predict_realtime({**inputs, "G2": np.nan})
+        uncached = ModelEngine(cache_size=0).predict_realtime({**inputs, "G2": np.nan})
+        self.assertEqual(missing['predicted_score'], uncached['predicted_score'])
+        print(f"   -> Cache info: {engine.cache_info()}")
+
+    def test_10_batch_explanations(self):
+        """Test batched SHAP values and top drivers in predict_batch"""
+        print("\n[Test] Batch Explanations...")
+        df = pd.read_csv("student-mat.csv", sep=';').head(30)
+        results = self.engine.predict_batch(df, explain=True, top_k=2, chunk_size=7)
+        shap_cols = [f"SHAP {f}" for f in self.engine.feature_names]
+        self.assertTrue(set(shap_cols) <= set(results.columns))
+
+        inputs = df.iloc[3][self.engine.feature_names].to_dict()
+        single = self.engine.predict_realtime(inputs)
+        impacts = [item['impact'] for item in single['explanation']]
+        self.assertTrue(np.allclose(results.iloc[3][shap_cols].astype(float), impacts, atol=1e-4))
+
+        for drivers, row in zip(results['Top Drivers'], results[shap_cols].to_numpy()):
+            self.assertLessEqual(len(drivers), 2)
+            for feature in drivers:
+                self.assertLess(row[self.engine.feature_names.index(feature)], 0)
+        print("   -> SHAP matrix matches per-row explanations.")
+
+    def test_11_batch_recommendations(self):
+        """Test vectorized recommendations against the per-student function"""
+        print("\n[Test] Batch Recommendations...")
+        df = pd.read_csv("student-mat.csv", sep=';').head(40)
+        results = self.engine.predict_batch(df, explain=True)
+        names = self.engine.feature_names
+        codes = get_recommendation_codes(
+            results[[f"SHAP {f}" for f in names]].to_numpy(),
+            results[names].to_numpy(),
+            results['Risk Val'].to_numpy(),
+            names, role="parent"
+        )
+        for i, row in enumerate(codes):
+            single = {
+                "explanation": [{"feature": f, "value": results.iloc[i][f], "impact": results.iloc[i][f"SHAP {f}"]}
+                                for f in names],
+                "risk_level": int(results.iloc[i]['Risk Val'])
+            }
+            self.assertEqual(render_recommendations(row, "hi"), get_recommendations(single, role="parent", lang="hi"))
+        print(f"   -> {len(codes)} students match.")
+
+    def test_12_model_artifact_roundtrip(self):
+        """Test that a fresh engine loads the saved artifact lazily"""
+        print("\n[Test] Model Artifact...")
+        loaded = ModelEngine()
+        self.assertTrue(loaded.load_models())
+        self.assertEqual(loaded.metadata['version'], self.engine.current_version())
+        self.assertEqual(loaded.metadata['feature_names'], self.engine.feature_names)
+        self.assertIn('train_rmse', loaded.metadata['metrics'])
+        self.assertIsNone(loaded.bundle._explainer)  # not built until an explanation is needed
+
+        inputs = {
+            "G1": 9, "G2": 8, "studytime": 1, "failures": 2,
+            "absences": 10, "health": 2, "freetime": 5, "goout": 5
+        }
+        self.assertEqual(loaded.predict_realtime(inputs), self.engine.predict_realtime(inputs))
+        self.assertIsNotNone(loaded.bundle._explainer)
+        print(f"   -> Loaded version {loaded.metadata['version']}.")
+
+    def test_13_connection_pool(self):
+        """Test pooled connections and SQLite pragmas"""
+        print("\n[Test] Connection Pool...")
+        with db.connection() as conn:
+            first = conn
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        with db.connection() as conn:
+            self.assertIs(conn, first)  # released connections are reused
+
+        # Concurrent readers and writers share the pool without lock errors
+        errors = []
+        def worker(i):
+            try:
+                db.add_student({"name": f"Pool Student {i}", "G1": 10, "G2": 10})
+                db.get_all_students()
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(10)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        self.assertEqual(errors, [])
+        self.assertEqual((db.get_all_students()['name'].str.startswith("Pool Student")).sum(), 10)
+        print("   -> Pool reused connections; 10 concurrent writers succeeded.")
+
+    def test_14_filtered_queries(self):
+        """Test filtered, paginated and aggregate queries"""
+        print("\n[Test] Filtered Queries...")
+        before = db.risk_distribution()
+        for i in range(7):
+            db.add_student({"name": f"Query Student {i}", "risk_level": i % 3, "predicted_score": float(i)})
+
+        self.assertEqual(db.count_students(name_prefix="Query Student"), 7)
+        self.assertEqual(db.count_students(name_prefix="Query", risk_level=0), 3)
+        self.assertEqual(db.count_students(name_prefix="Query", min_score=2, max_score=4), 3)
+
+        # Keyset pagination walks every row exactly once
+        seen, after = [], None
+        while True:
+            page = db.query_students(name_prefix="Query", after_id=after, limit=3)
+            if page.empty:
+                break
+            seen += page['name'].tolist()
+            after = page['student_id'].iloc[-1]
+        self.assertEqual(seen, [f"Query Student {i}" for i in range(7)])
+
+        after_dist = db.risk_distribution()
+        self.assertEqual(after_dist.get(2, 0) - before.get(2, 0), 2)
+        student_id = db.query_students(name_prefix="Query Student 4")['student_id'].iloc[0]
+        self.assertEqual(db.get_student(student_id)['name'], "Query Student 4")
+        print(f"   -> Risk distribution: {after_dist}")
+
+    def test_15_snapshot_cache(self):
+        """Test that repeated reads are cached until a write"""
+        print("\n[Test] Snapshot Cache...")
+        first = db.get_all_students()
+        queries = db.read_stats()["queries"]
+        second = db.get_all_students()
+        self.assertEqual(db.read_stats()["queries"], queries)
+        pd.testing.assert_frame_equal(first, second)
+
+        # Callers get their own copy
+        second['name'] = "changed"
+        self.assertNotIn("changed", db.get_all_students()['name'].tolist())
+
+        # Writes through this module invalidate the snapshot
+        db.add_student({"name": "Cache Student"})
+        self.assertEqual(len(db.get_all_students()), len(first) + 1)
+        self.assertEqual(db.read_stats()["queries"], queries + 1)
+
+        # So do commits from another connection (other threads / processes)
+        conn = sqlite3.connect(db.DB_NAME)
+        with conn:
+            conn.execute("DELETE FROM students WHERE name = 'Cache Student'")
+        conn.close()
+        self.assertEqual(len(db.get_all_students()), len(first))
+
+    def test_16_bulk_ingest(self):
+        """Test chunked executemany ingest with index rebuild and progress"""
+        print("\n[Test] Bulk Ingest...")
+        before = db.count_students()
+        df = pd.DataFrame({
+            "name": [f"Ingest Student {i}" for i in range(25)],
+            "G1": np.arange(25, dtype=np.uint8) % 20,
+            "G2": [np.nan] + [10.0] * 24,
+            "risk_level": np.int8(1),
+            "predicted_score": np.float32(12.5),
+            "not_a_db_column": 1,
+        })
+        calls = []
+        inserted = db.ingest(df, chunk_size=10, drop_indexes=True, progress=lambda done, total: calls.append((done, total)))
+
+        self.assertEqual(inserted, 25)
+        self.assertEqual(calls, [(10, 25), (20, 25), (25, 25)])
+        self.assertEqual(db.count_students(name_prefix="Ingest Student"), 25)
+        self.assertEqual(db.count_students() - before, 25)
+        first = db.query_students(name_prefix="Ingest Student 0", limit=1).iloc[0]
+        self.assertTrue(pd.isna(first['G2']))
+
+        # Indexes are rebuilt after the load
+        with db.connection() as conn:
+            indexes = {row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'students'")}
+        self.assertTrue({"idx_students_risk", "idx_students_score", "idx_students_name"} <= indexes)
+
+    def test_17_upsert(self):
+        """Test that re-uploads update students in place"""
+        print("\n[Test] Upsert By Natural Key...")
+        before = db.count_students()
+        df = pd.DataFrame({"name": [f"Student {i}" for i in range(5)], "G1": 10, "predicted_score": 8.0})
+        db.upsert_students(df, cohort="2024-A", drop_indexes=True)
+        db.upsert_students(df.assign(predicted_score=15.0), cohort="2024-A")
+        self.assertEqual(db.count_students() - before, 5)
+        self.assertEqual(db.count_students(name_prefix="Student", min_score=15), 5)
+
+        # Same names in another cohort are different students
+        db.upsert_students(df, cohort="2024-B")
+        self.assertEqual(db.count_students() - before, 10)
+
+        # An external id takes precedence over the name
+        ids = pd.DataFrame({"name": ["Renamed", "Other"], "external_id": [101.0, np.nan], "G1": 12})
+        db.upsert_students(ids)
+        db.upsert_students(ids.assign(name=["Renamed Again", "Other"]))
+        self.assertEqual(db.count_students(name_prefix="Renamed"), 1)
+        self.assertEqual(db.count_students(name_prefix="Other"), 1)
+        db.add_student({"name": "Renamed Once More", "external_id": 101})
+        self.assertEqual(db.count_students(name_prefix="Renamed"), 1)
+
+        # Tables from before the natural key are migrated in place
+        with tempfile.TemporaryDirectory() as tmp:
+            legacy = sqlite3.connect(os.path.join(tmp, "legacy.db"))
+            legacy.execute("CREATE TABLE students (student_id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, "
+                           "G1 INTEGER, risk_level INTEGER, predicted_score REAL)")
+            legacy.execute("INSERT INTO students (name, G1) VALUES ('Old', 5)")
+            db._create_schema(legacy)
+            columns = {row[1] for row in legacy.execute("PRAGMA table_info(students)")}
+            self.assertIn("student_key", columns)
+            self.assertEqual(legacy.execute("SELECT COUNT(*) FROM students").fetchone()[0], 1)
+            legacy.close()
+
+    def test_18_streaming_upload(self):
+        """Test chunked CSV upload: sniffed delimiter, usecols, upsert per chunk"""
+        print("\n[Test] Streaming CSV Upload...")
+        before = db.count_students()
+        with open("student-mat.csv", "rb") as f:
+            upload = io.BytesIO(f.read())
+        info = csv_ingest.inspect(upload, self.engine.feature_names)
+        self.assertEqual(info["sep"], ";")
+        self.assertTrue(info["has_target"])
+        self.assertEqual(info["missing_features"], [])
+
+        calls = []
+        saved = csv_ingest.save_upload(upload, self.engine, cohort="stream", chunksize=100,
+                                       progress=lambda done, total: calls.append((done, total)))
+        full = pd.read_csv("student-mat.csv", sep=';')
+        self.assertEqual(saved, len(full))
+        self.assertEqual(len(calls), -(-len(full) // 100))
+        self.assertEqual(calls[-1][0], calls[-1][1])
+        self.assertEqual(db.count_students() - before, len(full))
+
+        # Names are numbered across chunks and match whole-file predictions
+        row = db.query_students(name_prefix="Student 250", limit=1).iloc[0]
+        expected = self.engine.predict_batch(full.iloc[[250]])
+        self.assertAlmostEqual(row['predicted_score'], expected['Predicted Score'].iloc[0], places=4)
+
+        # Uploading the same file again updates in place
+        csv_ingest.save_upload(upload, self.engine, cohort="stream", chunksize=100)
+        self.assertEqual(db.count_students() - before, len(full))
+
+        training = csv_ingest.load_training_frame(upload, self.engine.feature_names, chunksize=100)
+        self.assertEqual(list(training.columns), self.engine.feature_names + ['G3'])
+        self.assertEqual(len(training), len(full))
+
+        # Different nameless files in one cohort do not overwrite each other
+        with open("student-por.csv", "rb") as f:
+            other = io.BytesIO(f.read())
+        csv_ingest.save_upload(other, self.engine, cohort="stream", chunksize=100)
+        csv_ingest.save_upload(other, self.engine, cohort="stream", chunksize=100)
+        por = pd.read_csv("student-por.csv", sep=';')
+        self.assertEqual(db.count_students() - before, len(full) + len(por))
+
+        # Other writers are not locked out while the upload is parsed and predicted
+        def write_meanwhile(done, total):
+            db.add_student({"name": "Concurrent Student", "G1": 10})
+        csv_ingest.save_upload(io.BytesIO(upload.getvalue()), self.engine, cohort="stream", chunksize=100,
+                               progress=write_meanwhile)
+        self.assertEqual(db.count_students(name_prefix="Concurrent Student"), -(-len(full) // 100))
+        with db.connection() as conn, conn:
+            conn.execute("DELETE FROM students WHERE name = 'Concurrent Student'")
+
+        # A bad row in a later chunk rolls back the chunks before it
+        count = db.count_students()
+        bad = por.copy()
+        bad.loc[len(bad) - 1, "absences"] = 300
+        upload = io.BytesIO(bad.to_csv(sep=';', index=False).encode())
+        with self.assertRaises(schema.SchemaError):
+            csv_ingest.save_upload(upload, self.engine, cohort="rollback", chunksize=100)
+        self.assertEqual(db.count_students(), count)
+
+        # Blank names are never upserted on a NULL or shared key
+        keys = db.natural_keys(pd.DataFrame({"name": ["Ann", None, "  "]}), cohort="c")
+        self.assertEqual(keys.iloc[0], "c:Ann")
+        self.assertTrue(keys.iloc[1:].isna().all())
+        blank = pd.DataFrame({"name": [None, None], "G1": 10})
+        db.upsert_students(blank, cohort="blank")
+        db.upsert_students(blank, cohort="blank")
+        self.assertEqual(db.count_students() - before, len(full) + len(por) + 4)
+
+    def test_19_background_training(self):
+        """Test training jobs in a worker process with activation on success"""
+        print("\n[Test] Background Training Jobs...")
+        df = pd.read_csv("student-mat.csv", sep=';')
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = ModelEngine(artifact_dir=tmp)
+            old_version = engine.train(df=df)
+            runner = training_jobs.TrainingJobRunner(engine)
+            try:
+                job_id = runner.submit(df[engine.feature_names + ['G3']].head(300))
+                self.assertIn(training_jobs.get_job(job_id)['status'],
+                              (training_jobs.QUEUED, training_jobs.RUNNING))
+                # The old model keeps serving while the job runs
+                self.assertIn('predicted_score', engine.predict_realtime(df[engine.feature_names].iloc[0].to_dict()))
+
+                job = runner.wait(job_id, timeout=300)
+                self.assertEqual(job['status'], training_jobs.SUCCEEDED, job['error'])
+                self.assertNotEqual(job['version'], old_version)
+                self.assertEqual(engine.current_version(), job['version'])
+                self.assertEqual(engine.metadata['version'], job['version'])
+                self.assertEqual(job['metrics']['n_rows'], 300)
+
+                # A failing job is recorded and leaves the active model alone
+                bad = runner.wait(runner.submit(df[engine.feature_names]), timeout=300)
+                self.assertEqual(bad['status'], training_jobs.FAILED)
+                self.assertIn("G3", bad['error'])
+                self.assertEqual(engine.current_version(), job['version'])
+
+                # A worker that dies fails its job and the next job gets a fresh pool
+                crashed = runner.wait(runner.submit(_CrashOnUnpickle()), timeout=300)
+                self.assertEqual(crashed['status'], training_jobs.FAILED)
+                runner._pool().submit(os._exit, 1).exception()  # break it between jobs too
+                again = runner.wait(runner.submit(df[engine.feature_names + ['G3']].head(200)), timeout=300)
+                self.assertEqual(again['status'], training_jobs.SUCCEEDED, again['error'])
+
+                # A job that cannot be submitted is not left queued
+                with mock.patch.object(runner, "_pool", side_effect=RuntimeError("no pool")):
+                    with self.assertRaises(RuntimeError):
+                        runner.submit(df)
+                failed = training_jobs.recent_jobs(1)[0]
+                self.assertEqual(failed['status'], training_jobs.FAILED)
+                self.assertIn("no pool", failed['error'])
+            finally:
+                runner.shutdown()
+
+            # Queued rows of an earlier process with our pid (e.g. PID 1 after a
+            # container restart) are failed on startup; our own are not
+            with db.connection() as conn, conn:
+                for start in ("another-boot:1", training_jobs._process_start(os.getpid())):
+                    conn.execute("INSERT INTO training_jobs (status, pid, process_start) VALUES (?, ?, ?)",
+                                 (training_jobs.QUEUED, os.getpid(), start))
+            stale, current = [j['job_id'] for j in training_jobs.recent_jobs(2)][::-1]
+            training_jobs.TrainingJobRunner(engine)
+            self.assertEqual(training_jobs.get_job(stale)['status'], training_jobs.FAILED)
+            self.assertEqual(training_jobs.get_job(current)['status'], training_jobs.QUEUED)
+            training_jobs._update(current, status=training_jobs.FAILED)
+        print(f"   -> Job {job_id} trained and activated {job['version']}")
+
+    def test_20_model_hot_swap(self):
+        """Test atomic bundle swaps and cross-process version pickup"""
+        print("\n[Test] Model Hot Swap...")
+        df = pd.read_csv("student-mat.csv", sep=';')
+        inputs = {"G1": 9, "G2": 8, "studytime": 1, "failures": 2,
+                  "absences": 10, "health": 2, "freetime": 5, "goout": 5}
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = ModelEngine(artifact_dir=tmp, cache_size=0)
+            v1 = engine.train(df=df.head(200))
+            v2 = engine.train(df=df.tail(200), activate=False)
+            self.assertEqual(engine.current_version(), v1)
+            self.assertEqual(sorted(os.listdir(tmp)), sorted(["LATEST", v1, v2]))  # no temp leftovers
+
+            expected = {}
+            for version in (v1, v2):
+                engine.activate(version)
+                expected[version] = engine.predict_realtime(inputs)
+            self.assertNotEqual(expected[v1]['predicted_score'], expected[v2]['predicted_score'])
+
+            # Every prediction made during swaps comes from exactly one version
+            results, stop = [], threading.Event()
+            def predict():
+                while not stop.is_set():
+                    results.append(engine.predict_realtime(inputs))
+            threads = [threading.Thread(target=predict) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for i in range(10):
+                engine.activate((v1, v2)[i % 2])
+            stop.set()
+            for t in threads:
+                t.join()
+            self.assertTrue(results)
+            for res in results:
+                self.assertIn(res, list(expected.values()))
+
+            # Another process's engine notices a new LATEST on its next check
+            other = ModelEngine(artifact_dir=tmp, reload_interval=0)
+            self.assertTrue(other.load_models())
+            engine.activate(v1 if other.bundle.version == v2 else v2)
+            other.predict_realtime(inputs)
+            self.assertEqual(other.bundle.version, engine.current_version())
+        print(f"   -> {len(results)} predictions during 10 swaps, all consistent.")
+
+    def test_21_cv_hyperparameter_search(self):
+        """Test parallel CV search, thread planning and saving the best trial"""
+        print("\n[Test] CV Hyperparameter Search...")
+        with mock.patch.object(training_pipeline.os, "cpu_count", return_value=8):
+            self.assertEqual(training_pipeline.plan_jobs(-1, 20), (8, 1))
+            self.assertEqual(training_pipeline.plan_jobs(2, 20), (2, 4))
+            self.assertEqual(training_pipeline.plan_jobs(-1, 3), (3, 2))
+
+        df = pd.read_csv("student-mat.csv", sep=';')
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = ModelEngine(artifact_dir=tmp)
+            # Pretend to have 2 cores so trials really run in worker processes
+            with mock.patch.object(training_pipeline.os, "cpu_count", return_value=2):
+                version, trials = training_pipeline.train_best(df, engine, n_trials=3, folds=3, school="GP")
+            self.assertEqual(len(trials), 3)
+            self.assertTrue(trials['cv_rmse'].is_monotonic_increasing)
+            for col in ['cv_rmse', 'cv_accuracy', 'wall_time_s', 'n_estimators', 'max_depth']:
+                self.assertIn(col, trials.columns)
+            self.assertTrue((trials['n_estimators'] < training_pipeline.MAX_ESTIMATORS).all())  # early stopped
+
+            self.assertEqual(engine.current_version(), version)
+            self.assertEqual(engine.metadata['params'], training_pipeline.best_params(trials))
+            self.assertEqual(engine.metadata['metrics']['n_rows'], (df['school'] == "GP").sum())
+            self.assertAlmostEqual(engine.metadata['metrics']['cv_rmse'], trials['cv_rmse'].iloc[0])
+
+        # Fixed configuration CV, as used by audit_model
+        cv = training_pipeline.cross_validate(df, {"n_estimators": 20}, folds=3)
+        self.assertEqual(cv['n_estimators'], 20)
+        self.assertGreater(cv['cv_accuracy'], 0.5)
+        print(f"   -> Best CV RMSE {trials['cv_rmse'].iloc[0]:.2f}, accuracy {trials['cv_accuracy'].iloc[0]:.2f}")
+
+    def test_22_derived_risk_mode(self):
+        """Test the single-booster mode that bins the predicted score into risk"""
+        print("\n[Test] Derived Risk Mode...")
+        df = pd.read_csv("student-mat.csv", sep=';')
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = ModelEngine(artifact_dir=tmp, risk_mode="derived")
+            version = engine.train(df=df)
+            self.assertIsNone(engine.classifier)
+            self.assertFalse(os.path.exists(os.path.join(tmp, version, "classifier.ubj")))
+            self.assertEqual(engine.read_metadata(version)['risk_mode'], "derived")
+
+            results = engine.predict_batch(df)
+            scores = engine.regressor.predict(df[engine.feature_names])
+            expected = np.where(scores < 9.5, 2, np.where(scores < 14.5, 1, 0))
+            self.assertTrue((results['Risk Val'].to_numpy() == expected).all())
+
+            loaded = ModelEngine(artifact_dir=tmp)
+            self.assertTrue(loaded.load_models())
+            self.assertEqual(loaded.bundle.risk_mode, "derived")
+            for i in range(0, len(df), 50):
+                res = loaded.predict_realtime(df.iloc[i][engine.feature_names].to_dict())
+                self.assertEqual(res['risk_level'], expected[i])
+
+        cv = training_pipeline.cross_validate(df, {"n_estimators": 20}, folds=3)
+        self.assertGreater(cv['cv_accuracy_derived'], 0.5)
+        print(f"   -> CV risk accuracy: classifier {cv['cv_accuracy']:.3f}, derived {cv['cv_accuracy_derived']:.3f}")
+
+    def test_23_seeded_data_generator(self):
+        """Test that generation is reproducible and scores use the 7-day window"""
+        print("\n[Test] Seeded Data Generator...")
+        first = data_generator.generate(20, days=30, seed=7, end_date="2024-06-30", names=False)
+        second = data_generator.generate(20, days=30, seed=7, end_date="2024-06-30", names=False)
+        for a, b in zip(first, second):
+            pd.testing.assert_frame_equal(a, b)
+        other = data_generator.generate(20, days=30, seed=8, end_date="2024-06-30", names=False)
+        self.assertFalse(first[1]['study_hours'].equals(other[1]['study_hours']))
+
+        students, logs, scores = first
+        self.assertEqual(len(logs), 20 * 31)
+        self.assertEqual(logs['date'].max(), pd.Timestamp("2024-06-30"))
+        self.assertEqual(len(scores), 20 * 5)
+
+        # Same window averages as a per-row loop, with the noise drawn from the same seed
+        scores = data_generator.generate_scores(students, logs, seed=3)
+        noise = np.random.default_rng(3).normal(0, 5, len(scores))
+        ability = students.set_index('student_id')['baseline_ability']
+        for i, row in scores.iterrows():
+            window = logs[(logs['student_id'] == row['student_id']) & (logs['date'] <= row['date']) &
+                          (logs['date'] > row['date'] - pd.Timedelta(days=7))]
+            expected = (ability[row['student_id']] * 60 + window['study_hours'].astype(float).mean() * 8
+                        - max(0, (7 - window['sleep_hours'].astype(float).mean()) * 2) + noise[i])
+            self.assertAlmostEqual(row['score'], round(min(100, max(0, expected)), 1), places=6)
+        print(f"   -> Reproducible; {len(logs)} logs, {len(scores)} scores match the windowed loop")
+
+    def test_24_partitioned_generation(self):
+        """Test sharded generation: worker-count independent and loadable by the feature engine"""
+        print("\n[Test] Partitioned Data Generation...")
+        with tempfile.TemporaryDirectory() as tmp:
+            one, two = os.path.join(tmp, "one"), os.path.join(tmp, "two")
+            stats = data_generator.generate_partitioned(one, 25, days=20, seed=5, end_date="2024-06-30",
+                                                        workers=1, shard_size=10)
+            data_generator.generate_partitioned(two, 25, days=20, seed=5, end_date="2024-06-30",
+                                                workers=2, shard_size=10)
+            self.assertEqual(stats['shards'], 3)
+            self.assertEqual(stats['daily_logs'], 25 * 21)
+            self.assertEqual(sorted(os.listdir(os.path.join(one, "scores"))),
+                             ["part-00000.parquet", "part-00001.parquet", "part-00002.parquet"])
+
+            students, logs, scores = feature_engineering.load_data(one)
+            for a, b in zip((students, logs, scores), feature_engineering.load_data(two)):
+                pd.testing.assert_frame_equal(a, b)
+            self.assertEqual(students['student_id'].nunique(), 25)
+            self.assertEqual(students['name'].iloc[-1], "Student 24")
+            self.assertIsInstance(logs['student_id'].dtype, pd.CategoricalDtype)
+
+            features = feature_engineering.compute_features(students, logs, scores)
+            self.assertEqual(features['student_id'].nunique(), 25)
+        print(f"   -> {stats['shards']} shards, {len(logs)} logs, {len(features)} feature rows.")
+
+    def test_25_parallel_features(self):
+        """Test that partitioned multi-process features equal the single-process result"""
+        print("\n[Test] Parallel Feature Engine...")
+        students, logs, scores = data_generator.generate(40, days=35, seed=11, names=False)
+        logs = logs.sample(frac=0.8, random_state=0)
+        serial = feature_engineering.compute_features(students, logs, scores)
+        parallel = feature_engineering.compute_features(students, logs, scores, workers=2)
+        pd.testing.assert_frame_equal(serial, parallel)
+        print(f"   -> {len(parallel)} feature rows match across 2 workers.")
+
+    def test_26_online_features(self):
+        """Test that streamed daily logs give the batch engine's features"""
+        print("\n[Test] Online Feature Updates...")
+        students, logs, scores = data_generator.generate(6, days=50, seed=4, end_date="2024-06-30", names=False)
+        logs = logs.sample(frac=0.7, random_state=0)
+        first = students['student_id'].iloc[0]
+        # A gap longer than every window for one student
+        logs = logs[~((logs['student_id'] == first) & (logs['date'] > "2024-05-20") & (logs['date'] < "2024-06-25"))]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store = OnlineFeatureStore(os.path.join(tmp, "online.db"))
+            try:
+                store.replay(logs, scores)
+                # Online features are for days after each student's latest event
+                last = pd.concat([logs[['student_id', 'date']], scores[['student_id', 'date']]])
+                last = last.groupby('student_id', observed=True)['date'].max()
+                for offset in (1, 9):
+                    exams = pd.DataFrame({"student_id": last.index.astype(object),
+                                          "date": last.to_numpy() + pd.Timedelta(days=offset),
+                                          "subject": "Math", "score": -1.0})
+                    all_scores = pd.concat([scores.astype({"student_id": object, "subject": object}), exams],
+                                           ignore_index=True)
+                    batch = feature_engineering.compute_features(students, logs, all_scores)
+                    for _, row in batch[batch['target_score'] == -1].iterrows():
+                        online = store.features(row['student_id'], as_of=row['exam_date'])
+                        for col in feature_engineering.FEATURE_COLUMNS[4:-1]:
+                            self.assertTrue(np.isclose(online[col], row[col], equal_nan=True), col)
+
+                # One event at a time: a new day, then a correction of that day
+                base = {"student_id": "s1", "attendance": 1, "sleep_hours": 7.0, "screen_time": 2.0}
+                store.record_log({**base, "date": "2024-01-01", "study_hours": 2.0})
+                store.record_log({**base, "date": "2024-01-02", "study_hours": 5.0})
+                features = store.record_log({**base, "date": "2024-01-02", "study_hours": 1.0})
+                self.assertAlmostEqual(features['avg_study_7d'], 1.5)
+                self.assertAlmostEqual(features['ewm_study'], pd.Series([2.0, 1.0]).ewm(span=7).mean().iloc[-1])
+                self.assertAlmostEqual(features['study_trend_14d'], -1.0)
+                with self.assertRaises(ValueError):
+                    store.record_log({**base, "date": "2023-12-31", "study_hours": 1.0})
+
+                # The state is read under the write lock: another writer cannot
+                # slip in between the load and the save
+                other = sqlite3.connect(os.path.join(tmp, "online.db"), timeout=0, isolation_level=None)
+                apply_log = online_features._apply_log
+                def apply_while_locked(state, log):
+                    with self.assertRaises(sqlite3.OperationalError):
+                        other.execute("BEGIN IMMEDIATE")
+                    apply_log(state, log)
+                with mock.patch("online_features._apply_log", apply_while_locked):
+                    store.record_log({**base, "date": "2024-01-03", "study_hours": 3.0})
+                other.close()
+                self.assertAlmostEqual(store.features("s1")['avg_study_7d'], 2.0)
+            finally:
+                store.close()
+
+            reopened = OnlineFeatureStore(os.path.join(tmp, "online.db"))
+            self.assertAlmostEqual(reopened.features("s1")['avg_study_7d'], 2.0)
+            reopened.close()
+        print(f"   -> Online state matches batch features for {len(last)} students.")
+
+    def test_27_nightly_feature_store_reads(self):
+        """Test that nightly updates read a bounded slice of history and match a full recompute"""
+        print("\n[Test] Bounded Nightly Feature Store Updates...")
+        students, logs, scores = data_generator.generate(12, days=120, seed=9, end_date="2024-06-30", names=False)
+        logs = logs.sample(frac=0.85, random_state=1)
+        days = sorted(logs['date'].unique())
+        late = scores[scores['date'] == days[70]]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store = FeatureStore(os.path.join(tmp, "store.db"))
+            try:
+                on_time = scores[scores['date'] != days[70]]
+                store.update(students, logs[logs['date'] <= days[100]], on_time[on_time['date'] <= days[100]])
+                with mock.patch("feature_store.compute_features",
+                                wraps=feature_engineering.compute_features) as compute:
+                    for day in days[101:]:
+                        store.update(students, logs[logs['date'] <= day], on_time[on_time['date'] <= day])
+                        # About one window of logs per student (plus one earlier row), not the whole history
+                        self.assertLessEqual(len(compute.call_args[0][1]), len(students) * 40)
+                    # A late score for an old exam also only reads a window before it
+                    self.assertGreater(len(late), 0)
+                    store.update(students, logs, scores)
+                    self.assertLessEqual(len(compute.call_args[0][1]), len(students) * 80)
+                stored = store.features()
+            finally:
+                store.close()
+
+        full = feature_engineering.compute_features(students, logs, scores)
+        full = full.sort_values(['exam_date', 'student_id']).reset_index(drop=True)
+        self.assertEqual(len(stored), len(full))
+        for col in feature_engineering.FEATURE_COLUMNS[4:]:
+            self.assertTrue(np.allclose(stored[col].astype(float), full[col], equal_nan=True), col)
+        print(f"   -> {len(days) - 101} nightly updates match a full recompute ({len(stored)} rows).")
+
 if __name__ == '__main__':
     unittest.main()
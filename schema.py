@@ -0,0 +1,86 @@
+"""
+Declared dtypes and valid ranges for student frames.
+
+Every load path (CSV upload, database reads, training data) goes through
+apply_schema() so frames carry compact dtypes (uint8/int8/float32 and
+categoricals) instead of pandas' default int64/float64/object.
+"""
+import pandas as pd
+
+# column: (dtype, min, max). None means unbounded.
+COLUMNS = {
+    "student_id": ("int32", 0, None),
+    "age": ("uint8", 0, 30),
+    "Medu": ("uint8", 0, 4),
+    "Fedu": ("uint8", 0, 4),
+    "traveltime": ("uint8", 1, 4),
+    "studytime": ("uint8", 1, 4),
+    "failures": ("uint8", 0, 4),
+    "famrel": ("uint8", 1, 5),
+    "freetime": ("uint8", 1, 5),
+    "goout": ("uint8", 1, 5),
+    "Dalc": ("uint8", 1, 5),
+    "Walc": ("uint8", 1, 5),
+    "health": ("uint8", 1, 5),
+    "absences": ("uint8", 0, 93),
+    "G1": ("uint8", 0, 20),
+    "G2": ("uint8", 0, 20),
+    "G3": ("uint8", 0, 20),
+    "risk_level": ("int8", 0, 2),
+    "predicted_score": ("float32", None, None),
+}
+
+# Low-cardinality text columns of the UCI student dataset
+CATEGORICAL = [
+    "school", "sex", "address", "famsize", "Pstatus", "Mjob", "Fjob", "reason", "guardian",
+    "schoolsup", "famsup", "paid", "activities", "nursery", "higher", "internet", "romantic"
+]
+
+class SchemaError(ValueError):
+    """Raised when a column holds values outside its declared range."""
+
+def _invalid(values, dtype, lo, hi):
+    """Mask of present values outside [lo, hi] (or non-integral for integer dtypes)."""
+    bad = pd.Series(False, index=values.index)
+    if lo is not None:
+        bad |= values < lo
+    if hi is not None:
+        bad |= values > hi
+    if dtype[0] in "ui":
+        bad |= values != values.round()
+    return bad & values.notna()
+
+def _check(col, values, dtype, lo, hi):
+    bad = _invalid(values, dtype, lo, hi)
+    if bad.any():
+        kind = "integers" if dtype[0] in "ui" else "values"
+        bounds = f"{lo if lo is not None else '-inf'}..{hi if hi is not None else 'inf'}"
+        examples = ", ".join(str(v) for v in values[bad].unique()[:3])
+        raise SchemaError(f"Column '{col}': {int(bad.sum())} invalid value(s), expected {kind} "
+                          f"in {bounds} (e.g. {examples})")
+
+def apply_schema(df, validate=True, categorical=True):
+    """
+    Return df with the declared compact dtypes applied to the columns it has.
+    Integer columns containing missing values become float32 instead, and
+    text columns become categoricals unless categorical is False.
+    Raises SchemaError if validate is True and a value is out of range;
+    with validate=False (read paths) invalid values become NaN instead of
+    wrapping around in the narrow integer dtype (300 absences as uint8 is 44).
+    """
+    df = df.copy(deep=False)
+    for col, (dtype, lo, hi) in COLUMNS.items():
+        if col not in df.columns:
+            continue
+        values = pd.to_numeric(df[col])
+        if validate:
+            _check(col, values, dtype, lo, hi)
+        else:
+            values = values.mask(_invalid(values, dtype, lo, hi))
+        if values.isna().any() and dtype[0] in "ui":
+            dtype = "float32"
+        df[col] = values.astype(dtype)
+    for col in CATEGORICAL if categorical else []:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
@@ -0,0 +1,160 @@
+"""
+Columnar storage layer for the project's datasets.
+
+CSV files are converted once into typed, compressed Parquet files next to
+them (student-mat.csv -> student-mat.parquet). load() reads the Parquet copy
+when it is up to date, projecting only the requested columns, and falls back
+to parsing the CSV otherwise, so callers never have to care which is present.
+A directory of part-*.parquet files (as written by
+data_generator.generate_partitioned) is loaded as one dataset.
+
+Usage: python storage.py convert [student-mat.csv daily_logs.csv ...]
+"""
+import os
+import pandas as pd
+import schema
+
+# Known datasets: CSV separator, column types and columns that are loaded as
+# categoricals (dictionary encoded) instead of one Python string per row.
+# Datasets flagged "schema" get the compact student dtypes from schema.py.
+DATASETS = {
+    "student-mat.csv": {"sep": ";", "dtypes": {}, "categorical": schema.CATEGORICAL, "schema": True},
+    "student-por.csv": {"sep": ";", "dtypes": {}, "categorical": schema.CATEGORICAL, "schema": True},
+    "students.csv": {
+        "sep": ",",
+        "dtypes": {"grade_level": "int8", "baseline_ability": "float64"},
+        "categorical": [],
+    },
+    "daily_logs.csv": {
+        "sep": ",",
+        "dtypes": {"date": "datetime64[ns]", "study_hours": "float64", "attendance": "int8",
+                   "sleep_hours": "float64", "screen_time": "float64"},
+        "categorical": ["student_id", "focus_subject"],
+    },
+    "scores.csv": {
+        "sep": ",",
+        "dtypes": {"date": "datetime64[ns]", "score": "float64"},
+        "categorical": ["student_id", "subject"],
+    },
+}
+
+DEFAULT_SPEC = {"sep": ",", "dtypes": {}, "categorical": []}
+
+def _spec(csv_path):
+    return DATASETS.get(os.path.basename(csv_path), DEFAULT_SPEC)
+
+def parquet_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+def _apply_types(df, spec):
+    if spec.get("schema"):
+        df = schema.apply_schema(df, categorical=False)
+    for col, dtype in spec["dtypes"].items():
+        if col in df.columns:
+            if dtype.startswith("datetime64"):
+                df[col] = pd.to_datetime(df[col]).astype(dtype)
+            else:
+                df[col] = df[col].astype(dtype)
+    return df
+
+def _arrow_schema(chunk, spec):
+    """
+    Nullable Arrow schema for a dataset's Parquet file: declared types for
+    the columns schema.py or the spec know (so a NaN first seen in a later
+    chunk, which makes that chunk's integer column float32, is written as
+    null in the declared type), strings for text columns, and the first
+    chunk's types for anything else.
+    """
+    import pyarrow as pa
+    inferred = pa.Schema.from_pandas(chunk, preserve_index=False)
+    fields = []
+    for col in chunk.columns:
+        if spec.get("schema") and col in schema.COLUMNS:
+            dtype = pa.from_numpy_dtype(schema.COLUMNS[col][0])
+        elif col in spec["dtypes"]:
+            dtype = spec["dtypes"][col]
+            dtype = pa.timestamp("ns") if dtype.startswith("datetime64") else pa.from_numpy_dtype(dtype)
+        elif col in spec["categorical"] or chunk[col].dtype.kind in "OSUT" or chunk[col].isna().all():
+            dtype = pa.string()
+        else:
+            dtype = inferred.field(col).type
+        fields.append(pa.field(col, dtype, nullable=True))
+    return pa.schema(fields)
+
+def convert(csv_path, chunksize=1_000_000):
+    """
+    Convert a CSV into a typed, zstd-compressed Parquet file.
+    The CSV is streamed in chunks so memory stays bounded for large logs;
+    every chunk is written with one schema declared up front (_arrow_schema).
+    Returns the Parquet path.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    spec = _spec(csv_path)
+    out_path = parquet_path(csv_path)
+    tmp_path = out_path + ".tmp"
+    writer = None
+    try:
+        for chunk in pd.read_csv(csv_path, sep=spec["sep"], chunksize=chunksize):
+            chunk = _apply_types(chunk, spec)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, _arrow_schema(chunk, spec), compression="zstd")
+            writer.write_table(pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp_path, out_path)
+    return out_path
+
+def has_fresh_parquet(csv_path):
+    """True if a Parquet copy exists and is not older than the CSV."""
+    pq_path = parquet_path(csv_path)
+    if not os.path.exists(pq_path):
+        return False
+    return not os.path.exists(csv_path) or os.path.getmtime(pq_path) >= os.path.getmtime(csv_path)
+
+def load_partitions(directory, columns=None):
+    """
+    Read every part-*.parquet file of a partitioned dataset directory, in file
+    name order, as one DataFrame. Categorical columns stay categorical (the
+    per-file dictionaries are unified).
+    """
+    import pyarrow.parquet as pq
+    if not any(name.startswith("part-") and name.endswith(".parquet") for name in os.listdir(directory)):
+        raise FileNotFoundError(f"No part-*.parquet files in {directory}")
+    return pq.read_table(directory, columns=columns).to_pandas()
+
+def load(csv_path, columns=None):
+    """
+    Load a dataset by its CSV path, reading only `columns` (all if None).
+    Uses the Parquet copy when it is fresh, otherwise parses the CSV.
+    A directory path is read with load_partitions.
+    """
+    if os.path.isdir(csv_path):
+        return load_partitions(csv_path, columns)
+    spec = _spec(csv_path)
+    if has_fresh_parquet(csv_path):
+        import pyarrow.parquet as pq
+        categorical = [c for c in spec["categorical"] if columns is None or c in columns]
+        table = pq.read_table(parquet_path(csv_path), columns=columns, read_dictionary=categorical)
+        return table.to_pandas()
+
+    df = pd.read_csv(csv_path, sep=spec["sep"], usecols=columns)
+    df = _apply_types(df, spec)
+    for col in spec["categorical"]:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Convert CSV datasets to Parquet.")
+    parser.add_argument("command", choices=["convert"])
+    parser.add_argument("files", nargs="*",
+                        default=[f for f in DATASETS if os.path.exists(f)])
+    args = parser.parse_args()
+
+    for csv_path in args.files:
+        out = convert(csv_path)
+        print(f"{csv_path} -> {out} ({os.path.getsize(csv_path) / 1e6:.1f} MB -> {os.path.getsize(out) / 1e6:.1f} MB)")
@@ -0,0 +1,205 @@
+"""
+Background model training.
+
+TrainingJobRunner trains in a separate process (ProcessPoolExecutor, spawn
+start method) so the Streamlit script thread that asked for it returns at
+once and every session keeps predicting with the current model. Each job
+writes a new, inactive artifact version; when it finishes successfully the
+runner activates that version on the shared engine. Job status lives in the
+training_jobs table of the app database so any session (or process) can
+follow it.
+
+A job row records the pid and start token of the process that submitted
+it. A pid alone is not enough to tell whether that process still exists:
+pids are reused, and in a container the app is PID 1 after every restart.
+"""
+import json
+import os
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from multiprocessing import get_context
+
+import database as db
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+def _ensure_table(conn):
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS training_jobs (
+                job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                status TEXT NOT NULL,
+                pid INTEGER,
+                process_start TEXT,
+                submitted_at TEXT,
+                started_at TEXT,
+                finished_at TEXT,
+                version TEXT,
+                metrics TEXT,
+                error TEXT
+            )
+        ''')
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(training_jobs)")}
+        if "process_start" not in columns:
+            conn.execute("ALTER TABLE training_jobs ADD COLUMN process_start TEXT")
+
+def _update(job_id, **fields):
+    with db.connection() as conn, conn:
+        conn.execute(f"UPDATE training_jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE job_id = ?",
+                     list(fields.values()) + [job_id])
+
+def _run_job(job_id, db_name, artifact_dir, risk_mode, df):
+    """Worker process entry point: train into a new inactive version."""
+    from model_engine import ModelEngine
+    db.DB_NAME = db_name
+    _update(job_id, status=RUNNING, started_at=_now())
+    engine = ModelEngine(artifact_dir=artifact_dir, risk_mode=risk_mode)
+    version = engine.train(df=df, activate=False)
+    return version, engine.read_metadata(version)["metrics"]
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _process_start(pid):
+    """
+    Token identifying one run of process pid: the boot id and the process
+    start time in clock ticks from /proc. None where /proc is not available.
+    """
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            boot_id = f.read().strip()
+        with open(f"/proc/{pid}/stat") as f:
+            # Fields after the parenthesized command name; starttime is field 22
+            fields = f.read().rsplit(")", 1)[1].split()
+        return f"{boot_id}:{fields[19]}"
+    except (OSError, IndexError):
+        return None
+
+def _process_alive(pid, start):
+    """Whether the process that recorded (pid, start) is still running."""
+    if pid is None or not _pid_alive(pid):
+        return False
+    # Same pid but another process (pid reuse, container restart)
+    return start is None or _process_start(pid) in (None, start)
+
+def get_job(job_id):
+    """Job row as a dict (metrics decoded), or None."""
+    with db.connection() as conn:
+        _ensure_table(conn)
+        cursor = conn.execute("SELECT * FROM training_jobs WHERE job_id = ?", (int(job_id),))
+        row = cursor.fetchone()
+        names = [c[0] for c in cursor.description]
+    if row is None:
+        return None
+    job = dict(zip(names, row))
+    job["metrics"] = json.loads(job["metrics"]) if job["metrics"] else None
+    return job
+
+def recent_jobs(limit=10):
+    """The newest jobs first, as dicts."""
+    with db.connection() as conn:
+        _ensure_table(conn)
+        ids = [r[0] for r in conn.execute("SELECT job_id FROM training_jobs ORDER BY job_id DESC LIMIT ?", (limit,))]
+    return [get_job(job_id) for job_id in ids]
+
+class TrainingJobRunner:
+    """Runs ModelEngine training jobs in a worker process and activates the result."""
+
+    def __init__(self, engine, max_workers=1):
+        self.engine = engine
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._done = {}
+        self._fail_orphaned_jobs()
+
+    def _fail_orphaned_jobs(self):
+        """Jobs left queued/running by a process that no longer exists never finish."""
+        with db.connection() as conn:
+            _ensure_table(conn)
+            rows = conn.execute("SELECT job_id, pid, process_start FROM training_jobs WHERE status IN (?, ?)",
+                                (QUEUED, RUNNING)).fetchall()
+        for job_id, pid, start in rows:
+            if not _process_alive(pid, start):
+                _update(job_id, status=FAILED, finished_at=_now(), error="interrupted (process exited)")
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=get_context("spawn"))
+            return self._executor
+
+    def _drop_pool(self, executor):
+        """Forget a broken executor (a worker died) so the next job gets a new one."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def _submit_to_pool(self, *args):
+        executor = self._pool()
+        try:
+            return executor, executor.submit(_run_job, *args)
+        except BrokenProcessPool:
+            # Broken since its last job finished: retry once on a fresh pool
+            self._drop_pool(executor)
+            executor = self._pool()
+            return executor, executor.submit(_run_job, *args)
+
+    def submit(self, df):
+        """Queue a training job on df (features + G3). Returns the job id immediately."""
+        with db.connection() as conn, conn:
+            _ensure_table(conn)
+            job_id = conn.execute(
+                "INSERT INTO training_jobs (status, pid, process_start, submitted_at) VALUES (?, ?, ?, ?)",
+                (QUEUED, os.getpid(), _process_start(os.getpid()), _now())).lastrowid
+        self._done[job_id] = threading.Event()
+        try:
+            executor, future = self._submit_to_pool(job_id, db.DB_NAME, self.engine.artifact_dir,
+                                                    self.engine.risk_mode, df)
+        except Exception as e:
+            # Never leave the row queued: nothing will ever pick it up
+            detail = "".join(traceback.format_exception_only(type(e), e)).strip()
+            _update(job_id, status=FAILED, finished_at=_now(), error=f"could not start: {detail}")
+            self._done[job_id].set()
+            raise
+        future.add_done_callback(lambda f: self._finish(job_id, f, executor))
+        return job_id
+
+    def _finish(self, job_id, future, executor):
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._drop_pool(executor)
+        try:
+            version, metrics = future.result()
+            # Only switch once the new version is fully written
+            self.engine.activate(version)
+            _update(job_id, status=SUCCEEDED, finished_at=_now(), version=version, metrics=json.dumps(metrics))
+        except Exception as e:
+            detail = "".join(traceback.format_exception_only(type(e), e)).strip()
+            _update(job_id, status=FAILED, finished_at=_now(), error=detail)
+        finally:
+            self._done[job_id].set()
+
+    def wait(self, job_id, timeout=None):
+        """Block until a job submitted by this runner has finished; returns its row."""
+        self._done[job_id].wait(timeout)
+        return get_job(job_id)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
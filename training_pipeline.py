@@ -0,0 +1,218 @@
+"""
+Cross-validated hyperparameter search for the ModelEngine boosters.
+
+Each trial is one hyperparameter set evaluated with stratified k-fold CV:
+in every fold both boosters are fit on the training part (early stopping on
+a slice of it, never on the held-out fold) and scored on the held-out fold.
+Trials run in parallel with joblib; XGBoost's own thread count is divided
+by the number of concurrent trials so the machine is not oversubscribed.
+The best trial is retrained on all rows and saved as a new model version
+with its CV scores in the metadata.
+
+Usage: python training_pipeline.py [--trials 20] [--folds 5] [--jobs -1]
+                                   [--school GP] [--report trials.csv] [--no-activate]
+                                   [--risk-mode classifier|derived]
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import storage
+from model_engine import FEATURE_NAMES, RISK_BINS, RISK_LABELS, ModelEngine, RISK_MODE_CLASSIFIER, RISK_MODE_DERIVED, derive_risk
+from schema import apply_schema
+
+# Search space; trials are sampled from its product
+PARAM_GRID = {
+    "max_depth": [2, 3, 4, 6],
+    "learning_rate": [0.03, 0.05, 0.1, 0.2],
+    "min_child_weight": [1, 3, 5],
+    "subsample": [0.7, 0.85, 1.0],
+    "colsample_bytree": [0.7, 1.0],
+}
+MAX_ESTIMATORS = 500
+EARLY_STOPPING_ROUNDS = 20
+# Share of each training fold held back to decide when to stop boosting
+EARLY_STOPPING_FRACTION = 0.15
+
+def sample_params(n_trials, seed=42):
+    """n_trials distinct parameter sets drawn from PARAM_GRID (all of it if smaller)."""
+    rng = np.random.default_rng(seed)
+    keys = list(PARAM_GRID)
+    sizes = [len(PARAM_GRID[k]) for k in keys]
+    total = int(np.prod(sizes))
+    picks = rng.choice(total, size=min(n_trials, total), replace=False)
+    trials = []
+    for flat in picks:
+        idx = np.unravel_index(flat, sizes)
+        trials.append({k: PARAM_GRID[k][i] for k, i in zip(keys, idx)})
+    return trials
+
+def plan_jobs(n_jobs, n_trials):
+    """(concurrent trials, XGBoost threads per trial) for the available cores."""
+    cores = os.cpu_count() or 1
+    outer = cores if n_jobs is None or n_jobs < 1 else min(n_jobs, cores)
+    outer = max(1, min(outer, n_trials))
+    return outer, max(1, cores // outer)
+
+def prepare(df, school=None):
+    """Model columns with validated dtypes, optionally for one school only."""
+    if school is not None:
+        if "school" not in df.columns:
+            raise ValueError("school filter needs a 'school' column")
+        df = df[df["school"] == school]
+    df = apply_schema(df[FEATURE_NAMES + ["G3"]]).reset_index(drop=True)
+    y_risk = pd.cut(df["G3"], bins=RISK_BINS, labels=RISK_LABELS).astype(int)
+    return df[FEATURE_NAMES], df["G3"], y_risk
+
+def _fit_early_stopped(model, X, y, seed):
+    """Fit on X minus a random EARLY_STOPPING_FRACTION slice used to stop boosting."""
+    rng = np.random.default_rng(seed)
+    val = rng.random(len(X)) < EARLY_STOPPING_FRACTION
+    model.fit(X[~val], y[~val], eval_set=[(X[val], y[val])], verbose=False)
+    return model.best_iteration + 1
+
+def run_trial(trial_id, params, X, y_score, y_risk, folds=5, seed=42, n_threads=1, early_stopping=True):
+    """
+    CV scores, wall time and boosting rounds of one parameter set. With
+    early_stopping=False params' own n_estimators is used as is (to evaluate
+    an already chosen configuration).
+    Risk accuracy is reported for both risk modes: cv_accuracy from the
+    classifier and cv_accuracy_derived from binning the regressor's
+    predictions, with the fit time of each booster.
+    """
+    import xgboost as xgb
+    from sklearn.metrics import accuracy_score, mean_squared_error, r2_score
+    from sklearn.model_selection import StratifiedKFold
+
+    start = time.perf_counter()
+    X, y_score, y_risk = X.to_numpy(np.float32), y_score.to_numpy(np.float32), y_risk.to_numpy()
+    common = dict(params, n_jobs=n_threads, random_state=seed)
+    if early_stopping:
+        common.update(n_estimators=MAX_ESTIMATORS, early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+    rmses, r2s, accuracies, derived_accuracies, rounds = [], [], [], [], []
+    fit_times = {"regressor": 0.0, "classifier": 0.0}
+    splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+    for fold, (train_idx, test_idx) in enumerate(splitter.split(X, y_risk)):
+        regressor = xgb.XGBRegressor(objective="reg:squarederror", **common)
+        classifier = xgb.XGBClassifier(eval_metric="mlogloss", **common)
+        for name, model, y in (("regressor", regressor, y_score), ("classifier", classifier, y_risk)):
+            fit_start = time.perf_counter()
+            if early_stopping:
+                n_rounds = _fit_early_stopped(model, X[train_idx], y[train_idx], seed + fold)
+            else:
+                model.fit(X[train_idx], y[train_idx])
+                n_rounds = model.n_estimators
+            fit_times[name] += time.perf_counter() - fit_start
+            if name == "regressor":
+                rounds.append(n_rounds)
+        preds = regressor.predict(X[test_idx])
+        rmses.append(np.sqrt(mean_squared_error(y_score[test_idx], preds)))
+        r2s.append(r2_score(y_score[test_idx], preds))
+        accuracies.append(accuracy_score(y_risk[test_idx], classifier.predict(X[test_idx])))
+        derived_accuracies.append(accuracy_score(y_risk[test_idx], derive_risk(preds)))
+
+    return {
+        "trial": trial_id,
+        **params,
+        "n_estimators": int(np.median(rounds)),
+        "cv_rmse": float(np.mean(rmses)),
+        "cv_rmse_std": float(np.std(rmses)),
+        "cv_r2": float(np.mean(r2s)),
+        "cv_accuracy": float(np.mean(accuracies)),
+        "cv_accuracy_derived": float(np.mean(derived_accuracies)),
+        "fit_time_regressor_s": fit_times["regressor"],
+        "fit_time_classifier_s": fit_times["classifier"],
+        "wall_time_s": time.perf_counter() - start,
+    }
+
+def cross_validate(df, params=None, folds=5, seed=42, school=None):
+    """Held-out CV scores of one fixed configuration (no search, no early stopping)."""
+    X, y_score, y_risk = prepare(df, school)
+    params = {"n_estimators": 100, **(params or {})}
+    return run_trial(0, params, X, y_score, y_risk, folds, seed,
+                     n_threads=os.cpu_count() or 1, early_stopping=False)
+
+def search(df, n_trials=20, folds=5, n_jobs=None, seed=42, school=None):
+    """
+    Run n_trials CV trials in parallel. Returns a DataFrame with one row per
+    trial (params, n_estimators, cv_rmse, cv_rmse_std, cv_r2, cv_accuracy,
+    wall_time_s), best (lowest cv_rmse) first.
+    """
+    from joblib import Parallel, delayed
+
+    X, y_score, y_risk = prepare(df, school)
+    trials = sample_params(n_trials, seed)
+    outer, n_threads = plan_jobs(n_jobs, len(trials))
+    rows = Parallel(n_jobs=outer)(
+        delayed(run_trial)(i, params, X, y_score, y_risk, folds, seed, n_threads)
+        for i, params in enumerate(trials)
+    )
+    return pd.DataFrame(rows).sort_values("cv_rmse", kind="stable").reset_index(drop=True)
+
+def best_params(trials):
+    """XGBoost parameters of the best trial, ready for ModelEngine.train."""
+    best = trials.iloc[0]
+    # The row is upcast to float; restore each grid value's own type
+    params = {k: type(values[0])(best[k]) for k, values in PARAM_GRID.items()}
+    params["n_estimators"] = int(best["n_estimators"])
+    return params
+
+def train_best(df, engine=None, n_trials=20, folds=5, n_jobs=None, seed=42, school=None, activate=True,
+               risk_mode=None):
+    """
+    Search, then train the best parameters on all (filtered) rows and save
+    them as a new version with the CV scores in its metrics (cv_accuracy is
+    the one matching the version's risk mode). Returns (version, trials).
+    """
+    engine = engine or ModelEngine()
+    trials = search(df, n_trials, folds, n_jobs, seed, school)
+    best = trials.iloc[0]
+    engine_mode = risk_mode or engine.risk_mode
+    derived = engine_mode == RISK_MODE_DERIVED
+    cv_metrics = {
+        "cv_rmse": float(best["cv_rmse"]),
+        "cv_rmse_std": float(best["cv_rmse_std"]),
+        "cv_r2": float(best["cv_r2"]),
+        "cv_accuracy": float(best["cv_accuracy_derived" if derived else "cv_accuracy"]),
+        "cv_folds": folds,
+        "trials": len(trials),
+        "school": school,
+    }
+    X, y_score, _ = prepare(df, school)
+    version = engine.train(df=X.assign(G3=y_score), activate=activate,
+                           params=best_params(trials), extra_metrics=cv_metrics, risk_mode=engine_mode)
+    return version, trials
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default="student-mat.csv")
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--jobs", type=int, default=-1, help="concurrent trials (-1: one per core)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--school", help="train on one school's rows only (e.g. GP, MS)")
+    parser.add_argument("--report", help="write the per-trial table to this CSV")
+    parser.add_argument("--no-activate", action="store_true", help="save the version without making it active")
+    parser.add_argument("--risk-mode", choices=[RISK_MODE_CLASSIFIER, RISK_MODE_DERIVED], default=RISK_MODE_CLASSIFIER,
+                        help="'derived' trains only the regressor and bins its prediction into risk levels")
+    args = parser.parse_args()
+
+    columns = FEATURE_NAMES + ["G3"] + (["school"] if args.school else [])
+    df = storage.load(args.data, columns=columns)
+    start = time.perf_counter()
+    version, trials = train_best(df, n_trials=args.trials, folds=args.folds, n_jobs=args.jobs,
+                                 seed=args.seed, school=args.school, activate=not args.no_activate,
+                                 risk_mode=args.risk_mode)
+    outer, n_threads = plan_jobs(args.jobs, len(trials))
+    print(f"{len(trials)} trials x {args.folds} folds in {time.perf_counter() - start:.1f}s "
+          f"({outer} parallel trials x {n_threads} XGBoost threads)")
+    print(trials.head(10).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    print(f"Saved version {version}")
+    if args.report:
+        trials.to_csv(args.report, index=False)
+
+if __name__ == "__main__":
+    main()
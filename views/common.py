@@ -0,0 +1,19 @@
+import streamlit as st
+import database as db
+
+# Max students offered in a picker; narrow down with the name search
+PICKER_LIMIT = 100
+
+def select_student(label):
+    """
+    Sidebar name search + selectbox backed by a filtered DB query.
+    Returns the selected student's row, or None if nothing matches.
+    """
+    prefix = st.sidebar.text_input("🔍 Search by name", "")
+    matches = db.query_students(name_prefix=prefix.strip() or None, limit=PICKER_LIMIT)
+    if matches.empty:
+        st.sidebar.caption("No matching students.")
+        return None
+    labels = matches['student_id'].astype(str) + " - " + matches['name']
+    s_label = st.sidebar.selectbox(label, labels.tolist())
+    return matches[labels == s_label].iloc[0]
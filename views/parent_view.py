@@ -1,24 +1,24 @@
 import streamlit as st
 from recommendations import get_recommendations
 from translations import TRANSLATIONS
+import database as db
+from views.common import select_student
 
 def render_parent_view(engine, lang="en"):
     t = TRANSLATIONS.get(lang, TRANSLATIONS["en"])
     
     st.markdown(f"<h1 style='text-align: center; animation: fadeIn 1s;'>{t['title_parent']}</h1>", unsafe_allow_html=True)
     
-    # Check for uploaded data
-    if 'student_data_db' not in st.session_state or st.session_state['student_data_db'].empty:
+    # Check for stored students
+    if not db.count_students():
         st.warning(t["no_data_parent"]) # Ensure this key exists or use generic text
         st.info("Please ask a teacher to add student records or upload data.")
         return
 
-    df = st.session_state['student_data_db']
-    # Create label with ID and Name
-    df['label'] = df['student_id'].astype(str) + " - " + df['name']
-    
-    s_label = st.sidebar.selectbox("Select Child", df['label'].tolist())
-    selected_student = df[df['label'] == s_label].iloc[0]
+    selected_student = select_student("Select Child")
+    if selected_student is None:
+        st.info("No student matches your search.")
+        return
     student_name = selected_student['name']
     
     # Inputs from DB
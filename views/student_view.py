@@ -1,9 +1,9 @@
 import streamlit as st
 import time
-from model_engine import ModelEngine
 from recommendations import get_recommendations
-import plotly.express as px
 from translations import TRANSLATIONS
+import database as db
+from views.common import select_student
 
 def render_student_view(engine, lang="en"):
     t = TRANSLATIONS.get(lang, TRANSLATIONS["en"])
@@ -13,13 +13,10 @@ def render_student_view(engine, lang="en"):
     # Sidebar inputs for simulation
     st.sidebar.header(t["simulate"])
     
-    # Check for uploaded data
+    # Check for stored students
     selected_student = None
-    if 'student_data_db' in st.session_state:
-        df = st.session_state['student_data_db']
-        df['label'] = df['student_id'].astype(str) + " - " + df['name']
-        s_label = st.sidebar.selectbox("Select Student", df['label'].tolist())
-        selected_student = df[df['label'] == s_label].iloc[0]
+    if db.count_students():
+        selected_student = select_student("Select Student")
 
     def get_val(col, default):
         if selected_student is not None and col in selected_student:
@@ -118,6 +115,7 @@ def render_student_view(engine, lang="en"):
         # Map translated names to colors
         color_map = {names[0]: '#4a4ae2', names[1]: '#ff9f1c', names[2]: '#ef233c'}
         
+        import plotly.express as px  # deferred: heavy import, only needed for charts
         fig = px.pie(values=values, names=names, hole=0.7, color=names, color_discrete_map=color_map)
         fig.update_layout(
             paper_bgcolor='rgba(0,0,0,0)',
@@ -1,7 +1,10 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 from translations import TRANSLATIONS
+from recommendations import get_recommendation_codes, render_recommendations
+import database as db
+
+AT_RISK_PAGE_SIZE = 25
 
 def render_teacher_view(engine, lang="en"):
     t = TRANSLATIONS.get(lang, TRANSLATIONS["en"])
@@ -14,45 +17,68 @@ def render_teacher_view(engine, lang="en"):
     # Real Class Data from DB
     st.subheader(t["class_overview"])
     
-    if 'student_data_db' in st.session_state:
-        df = st.session_state['student_data_db']
-        
-        # Translate risk level for display
-        def translate_risk(val):
-            if val == 2: return t["risk_high"]
-            if val == 1: return t["risk_medium"]
-            return t["risk_low"]
-            
-        df['Risk Level Display'] = df['risk_level'].apply(translate_risk)
-        
-        # Prepare display dataframe
-        cols_to_show = ['student_id', 'name', 'predicted_score', 'Risk Level Display', 'risk_level']
-        # Add G1/G2 if exist
-        if 'G1' in df.columns: cols_to_show.insert(2, 'G1')
-        if 'G2' in df.columns: cols_to_show.insert(3, 'G2')
-            
-        df_final = df[cols_to_show].rename(columns={'Risk Level Display': 'Risk Level', 'predicted_score': 'Predicted Score'})
-        
-    else:
-        st.info("Database is empty. Please add students or upload data.")
-        df_final = pd.DataFrame()
+    # Translate risk level for display
+    risk_names = {2: t["risk_high"], 1: t["risk_medium"], 0: t["risk_low"]}
+    
+    # Aggregates come from GROUP BY, not from loading the whole table
+    risk_counts = db.risk_distribution()
     
-    if not df_final.empty:
+    if not risk_counts:
+        st.info("Database is empty. Please add students or upload data.")
+    else:
         # Heatmap of Risk
-        risk_counts = df_final['Risk Level'].value_counts()
-        fig = px.pie(risk_counts, values=risk_counts.values, names=risk_counts.index, 
-                     title="Class Risk Distribution", hole=0.4,
+        import plotly.express as px  # deferred: heavy import, only needed for charts
+        fig = px.pie(values=list(risk_counts.values()), names=[risk_names[k] for k in risk_counts],
+                     title="Class Risk Distribution", hole=0.4, color=[risk_names[k] for k in risk_counts],
                      color_discrete_map={t["risk_high"]: "red", t["risk_medium"]: "orange", t["risk_low"]: "green"})
         st.plotly_chart(fig, use_container_width=True)
         
-        # At-Risk List
+        # At-Risk List, one page at a time (keyset pagination on student_id)
         st.markdown(f"### {t['at_risk_students']}")
-        high_risk = df_final[df_final['risk_level'] == 2]
+        cursors = st.session_state.setdefault('at_risk_cursors', [None])
+        high_risk = db.query_students(risk_level=2, after_id=cursors[-1], limit=AT_RISK_PAGE_SIZE)
         if not high_risk.empty:
-            st.dataframe(high_risk.style.applymap(lambda x: 'color: red' if x == t['risk_high'] else '', subset=['Risk Level']))
+            # Per-student reasons from one batched SHAP pass
+            explained = engine.predict_batch(high_risk, explain=True)
+            codes = get_recommendation_codes(
+                explained[[f"SHAP {f}" for f in engine.feature_names]].to_numpy(),
+                explained[engine.feature_names].to_numpy(),
+                explained['risk_level'].to_numpy(),
+                engine.feature_names, role="teacher"
+            )
+            
+            # Prepare display dataframe
+            df_final = pd.DataFrame({
+                'student_id': high_risk['student_id'],
+                'name': high_risk['name'],
+                'G1': high_risk['G1'],
+                'G2': high_risk['G2'],
+                'Predicted Score': high_risk['predicted_score'],
+                'Risk Level': high_risk['risk_level'].map(risk_names),
+                'Key Drivers': explained['Top Drivers'].str.join(", "),
+                'Action Plan': [" ".join(render_recommendations(row, lang)) for row in codes],
+            })
+            st.dataframe(df_final.style.map(lambda x: 'color: red' if x == t['risk_high'] else '', subset=['Risk Level']))
+            
+            total = risk_counts.get(2, 0)
+            page = len(cursors)
+            st.caption(f"Page {page} of {-(-total // AT_RISK_PAGE_SIZE)} ({total} students)")
+            col_prev, col_next = st.columns(2)
+            with col_prev:
+                if page > 1 and st.button("⬅️ Previous"):
+                    cursors.pop()
+                    st.rerun()
+            with col_next:
+                if page * AT_RISK_PAGE_SIZE < total and st.button("Next ➡️"):
+                    cursors.append(int(high_risk['student_id'].iloc[-1]))
+                    st.rerun()
             
             if st.button(t["email_parents"]):
                 st.success("Alerts sent to parents!")
+        elif len(cursors) > 1:
+            # Page emptied by deletions; start over
+            st.session_state['at_risk_cursors'] = [None]
+            st.rerun()
         else:
             st.success(t["no_risk"])
     
@@ -74,7 +100,6 @@ def render_teacher_view(engine, lang="en"):
             
         submitted = st.form_submit_button("Add Student")
         if submitted:
-            import database as db
             # Predict first
             inputs = {
                 "G1": g1, "G2": g2, "studytime": studytime, "failures": failures,